@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable
+
+
+class PairWindow:
+    """The last few samples one gateway heard from one beacon."""
+
+    __slots__ = ("samples", "total", "last_ts", "last_rssi")
+
+    def __init__(self, capacity: int):
+        self.samples: deque[tuple[float, int]] = deque(maxlen=capacity)
+        self.total = 0  # running sum of the rssi in samples
+        self.last_ts = 0.0
+        self.last_rssi = 0
+
+    def append(self, ts: float, rssi: int):
+        if len(self.samples) == self.samples.maxlen:
+            self.total -= self.samples[0][1]
+        self.samples.append((ts, rssi))
+        self.total += rssi
+        self.last_ts = ts
+        self.last_rssi = rssi
+
+    @property
+    def mean(self) -> float:
+        return self.total / len(self.samples)
+
+    def as_dict(self, gateway_mac: str) -> dict:
+        return {
+            "gateway": gateway_mac,
+            "rssi": self.mean,
+            "last_rssi": self.last_rssi,
+            "timestamp": self.last_ts,
+            "samples": len(self.samples),
+        }
+
+
+def _rerank(ranking: list[str], pairs: dict[str, PairWindow], gateway_mac: str):
+    # Only gateway_mac's mean changed: move it up or down to its new place
+    i = ranking.index(gateway_mac)
+    mean = pairs[gateway_mac].mean
+    while i > 0 and pairs[ranking[i - 1]].mean < mean:
+        ranking[i - 1], ranking[i] = ranking[i], ranking[i - 1]
+        i -= 1
+    while i < len(ranking) - 1 and pairs[ranking[i + 1]].mean > mean:
+        ranking[i + 1], ranking[i] = ranking[i], ranking[i + 1]
+        i += 1
+
+
+class BeaconIndex:
+    """beacon -> gateway -> recent samples, plus gateway -> beacons in range.
+
+    Each beacon also keeps its gateways ranked by mean RSSI. A sample only
+    moves its gateway within that beacon's short ranking, so "strongest N
+    gateways for beacon X" is a slice rather than a scan of the store.
+    """
+
+    def __init__(self, capacity: int = 20):
+        self.capacity = capacity
+        self.beacons: dict[str, dict[str, PairWindow]] = {}
+        self.rankings: dict[str, list[str]] = {}
+        self.gateways: dict[str, dict[str, PairWindow]] = {}
+        self._lock = threading.Lock()
+
+    def update(self, gateway_mac: str, samples: Iterable[tuple[str, int]], ts: float):
+        with self._lock:
+            in_range = self.gateways.get(gateway_mac)
+            if in_range is None:
+                in_range = self.gateways[gateway_mac] = {}
+            for mac, rssi in samples:
+                pairs = self.beacons.get(mac)
+                if pairs is None:
+                    pairs = self.beacons[mac] = {}
+                    self.rankings[mac] = []
+                window = pairs.get(gateway_mac)
+                ranking = self.rankings[mac]
+                if window is None:
+                    window = pairs[gateway_mac] = in_range[mac] = PairWindow(
+                        self.capacity
+                    )
+                    ranking.append(gateway_mac)
+                window.append(ts, rssi)
+                if len(ranking) > 1:
+                    _rerank(ranking, pairs, gateway_mac)
+
+    def sweep(self, idle_before: float | None, evicted: Iterable[str] = ()) -> int:
+        """Forget evicted beacons and those no gateway heard since idle_before."""
+        with self._lock:
+            drop = {mac for mac in evicted if mac in self.beacons}
+            if idle_before is not None:
+                drop.update(
+                    mac
+                    for mac, pairs in self.beacons.items()
+                    if max(w.last_ts for w in pairs.values()) < idle_before
+                )
+            for mac in drop:
+                for gateway_mac in self.beacons.pop(mac):
+                    in_range = self.gateways[gateway_mac]
+                    del in_range[mac]
+                    if not in_range:
+                        del self.gateways[gateway_mac]
+                del self.rankings[mac]
+        return len(drop)
+
+    def samples(self, mac: str, gateway_mac: str) -> list[tuple[float, int]]:
+        window = self.beacons.get(mac, {}).get(gateway_mac)
+        return list(window.samples) if window is not None else []
+
+    def strongest(
+        self, mac: str, n: int = 3, max_age: float | None = None
+    ) -> list[dict]:
+        pairs = self.beacons.get(mac)
+        if not pairs:
+            return []
+        cutoff = time.time() - max_age if max_age is not None else None
+        result = []
+        for gateway in list(self.rankings.get(mac, ())):
+            window = pairs[gateway]
+            if cutoff is not None and window.last_ts < cutoff:
+                continue
+            result.append(window.as_dict(gateway))
+            if len(result) == n:
+                break
+        return result
+
+    def near(self, gateway_mac: str, max_age: float | None = None) -> list[dict]:
+        cutoff = time.time() - max_age if max_age is not None else None
+        result = []
+        for mac, window in list(self.gateways.get(gateway_mac, {}).items()):
+            if cutoff is not None and window.last_ts < cutoff:
+                continue
+            result.append({"mac": mac, **window.as_dict(gateway_mac)})
+        result.sort(key=lambda item: item["rssi"], reverse=True)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "beacons": len(self.beacons),
+            "gateways": len(self.gateways),
+            "pairs": sum(len(p) for p in list(self.beacons.values())),
+        }
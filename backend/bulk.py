@@ -0,0 +1,79 @@
+import csv
+import io
+import re
+
+from models.gateway import Gateway
+from registry import CATEGORIES, RegistrySnapshot, normalize_mac
+
+CSV_COLUMNS = ("category", "mac_address", "name", "x", "y", "z", "id")
+MAC_PATTERN = re.compile(r"^[0-9a-f]{12}$")
+
+
+def parse_csv(text: str) -> list[dict]:
+    return list(csv.DictReader(io.StringIO(text.strip())))
+
+
+def validate_rows(
+    rows: list[dict], snapshot: RegistrySnapshot, upsert: bool
+) -> tuple[list[Gateway], list[dict]]:
+    gateways, errors, seen, seen_ids = [], [], set(), set()
+    id_owners = {
+        meta["id"]: mac
+        for mac, meta in snapshot.metadata.items()
+        if meta.get("id") is not None
+    }
+    for line, row in enumerate(rows, start=1):
+        problems = []
+        category = str(row.get("category") or "").strip()
+        mac = normalize_mac(str(row.get("mac_address") or ""))
+        if category not in CATEGORIES:
+            problems.append(f"invalid category {category!r}")
+        if not MAC_PATTERN.match(mac):
+            problems.append(f"invalid MAC address {row.get('mac_address')!r}")
+        elif mac in seen:
+            problems.append(f"duplicate MAC address {mac} in batch")
+        elif mac in snapshot.owners and not upsert:
+            problems.append(f"MAC address {mac} already exists")
+        seen.add(mac)
+
+        values = {}
+        for axis in ("x", "y", "z"):
+            try:
+                values[axis] = float(row.get(axis))
+            except (TypeError, ValueError):
+                problems.append(f"{axis} must be a number")
+        raw_id = row.get("id")
+        try:
+            values["id"] = int(raw_id) if raw_id not in (None, "") else None
+        except (TypeError, ValueError):
+            problems.append("id must be an integer")
+        gateway_id = values.get("id")
+        if gateway_id is not None:
+            owner = id_owners.get(gateway_id, mac)
+            if owner != mac:
+                problems.append(f"id {gateway_id} is taken by {owner}")
+            elif gateway_id in seen_ids:
+                problems.append(f"duplicate id {gateway_id} in batch")
+            else:
+                seen_ids.add(gateway_id)
+
+        if problems:
+            errors.append({"row": line, "errors": problems})
+            continue
+        gateways.append(
+            Gateway(
+                mac_address=mac,
+                name=str(row.get("name") or mac),
+                gw_type=category,
+                **values,
+            )
+        )
+    return gateways, errors
+
+
+def to_csv(rows: list[dict]) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
@@ -0,0 +1,89 @@
+import json
+from collections.abc import Callable
+from typing import Any
+
+from core.config import settings
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# (type, mac, rssi) for every element of a /status payload
+BeaconTuple = tuple[str | None, str | None, int | None]
+
+
+def _tuples(items: Any) -> list[BeaconTuple]:
+    return [
+        (item.get("type"), item.get("mac"), item.get("rssi"))
+        for item in items
+        if isinstance(item, dict)
+    ]
+
+
+if msgspec is not None:
+
+    class BeaconRecord(msgspec.Struct):
+        # Only the fields we use; everything else in the record is skipped
+        type: str | None = None
+        mac: str | None = None
+        rssi: int | None = None
+
+    _beacon_decoder = msgspec.json.Decoder(list[BeaconRecord])
+    _generic_decoder = msgspec.json.Decoder()
+
+    def _msgspec_beacons(payload: bytes) -> list[BeaconTuple]:
+        try:
+            records = _beacon_decoder.decode(payload)
+        except msgspec.ValidationError:
+            # Unexpected shape (e.g. float rssi); take the untyped path
+            return _tuples(_generic_decoder.decode(payload))
+        return [(r.type, r.mac, r.rssi) for r in records]
+
+
+def _select_backend(name: str) -> str:
+    if name == "auto":
+        if msgspec is not None:
+            return "msgspec"
+        if orjson is not None:
+            return "orjson"
+        return "json"
+    if name == "msgspec" and msgspec is None:
+        raise ValueError("JSON_BACKEND=msgspec but msgspec is not installed")
+    if name == "orjson" and orjson is None:
+        raise ValueError("JSON_BACKEND=orjson but orjson is not installed")
+    if name not in ("msgspec", "orjson", "json"):
+        raise ValueError(f"Unknown JSON_BACKEND {name!r}")
+    return name
+
+
+backend = _select_backend(settings.JSON_BACKEND)
+
+loads: Callable[[bytes], Any]
+dumps: Callable[[Any], bytes]
+decode_beacons: Callable[[bytes], list[BeaconTuple]]
+
+if backend == "msgspec":
+    loads = _generic_decoder.decode
+    dumps = msgspec.json.encode
+    decode_beacons = _msgspec_beacons
+elif backend == "orjson":
+    loads = orjson.loads
+    dumps = orjson.dumps
+
+    def decode_beacons(payload: bytes) -> list[BeaconTuple]:
+        return _tuples(orjson.loads(payload))
+
+else:
+    loads = json.loads
+
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    def decode_beacons(payload: bytes) -> list[BeaconTuple]:
+        return _tuples(json.loads(payload))
@@ -0,0 +1,91 @@
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(
+        env_file=(".env", ".env.local"), env_ignore_empty=True, extra="ignore"
+    )
+
+    # Logging
+    LOG_LEVEL: str = "INFO"
+    LOG_RATE_LIMIT: float = 10.0  # seconds between repeats of one message, 0 = off
+
+    # Database
+    DATABASE_URL: str = "sqlite:///./gateway_data.db"
+    DB_POOL_SIZE: int = 5
+    DB_FLUSH_INTERVAL: float = 1.0  # seconds between write-behind flushes
+
+    # MQTT subscriptions: one /gw/+/... wildcard set instead of per-gateway topics
+    MQTT_WILDCARD_SUBSCRIBE: bool = False
+
+    # Scale-out: "external" leaves /status traffic to ingest_worker.py processes,
+    # which share it through an MQTT v5 shared subscription and write to Redis
+    INGEST_MODE: str = "embedded"  # embedded or external
+    INGEST_PROCESSES: int = 2
+    MQTT_SHARED_GROUP: str = "ingest"
+    REDIS_URL: str = "redis://localhost:6379/0"
+    REDIS_PREFIX: str = "rssi"
+    REGISTRY_RELOAD_INTERVAL: float = 10.0  # seconds between worker registry reloads
+    # Rebuild the beacon index and filters (and so positions) from the relayed
+    # samples. With several API workers, enable it on the one serving positioning
+    RELAY_STATE: bool = True
+
+    # MQTT ingest
+    INGEST_QUEUE_SIZE: int = 10000
+    INGEST_WORKERS: int = 1
+    INGEST_BATCH_SIZE: int = 100
+    INGEST_DROP_POLICY: str = "drop_oldest"  # drop_newest, drop_oldest or block
+    INGEST_BLOCK_TIMEOUT: float = 0.05
+
+    # Payload decoding: auto, msgspec, orjson or json
+    JSON_BACKEND: str = "auto"
+
+    # RSSI and gateway stores: memory (per process) or redis (shared)
+    STORE_BACKEND: str = "memory"
+    STORE_CAPACITY: int = 100  # samples kept per beacon MAC
+    STORE_CACHE_TTL: float = 0.5  # seconds a Redis read is reused
+    STORE_TTL: float = 3600.0  # evict beacons idle this long, 0 = never
+    STORE_MAX_MACS: int = 100_000  # least recently heard beacons go first, 0 = no cap
+    STORE_ALLOW_LIST: bool = False  # only store beacons registered as devices
+    STORE_SWEEP_INTERVAL: float = 30.0
+
+    # Server-side beacon filter for gateways without their own (GatewayConfig semantics)
+    PREFILTER_RSSI: int | None = None  # drop beacons weaker than this
+    PREFILTER_REGEX_MAC: str | None = None  # keep only MACs matching this
+
+    # Live WebSocket/SSE push
+    LIVE_RATE: float = 2.0  # frames per second sent to subscribers
+    LIVE_CLIENT_QUEUE: int = 10  # frames buffered per client before dropping
+    LIVE_POSITION_EPSILON: float = 0.05  # metres a position must move to be resent
+
+    # RSSI history: hourly-partitioned compressed column files
+    HISTORY_ENABLED: bool = False
+    HISTORY_DIR: str = "./history"
+    HISTORY_FLUSH_INTERVAL: float = 10.0
+    HISTORY_MAX_BUFFER: int = 1_000_000  # samples held in memory between flushes
+
+    # beacon -> gateway -> recent samples index
+    INDEX_PAIR_CAPACITY: int = 20  # samples kept per (beacon, gateway) pair
+
+    # Per (beacon, gateway) signal filters, updated on every sample
+    FILTER_EWMA_ALPHA: float = 0.3
+    FILTER_KALMAN_Q: float = 0.5  # process noise, dB^2 per second
+    FILTER_KALMAN_R: float = 4.0  # measurement noise, dB^2
+    FILTER_HAMPEL_WINDOW: int = 7
+    FILTER_HAMPEL_K: float = 3.0  # outlier threshold in robust standard deviations
+
+    # Positioning
+    POSITION_TX_POWER: float = -59.0  # RSSI at 1 m
+    POSITION_PATH_LOSS_EXPONENT: float = 2.0
+    POSITION_MIN_GATEWAYS: int = 3
+    POSITION_INTERVAL: float = 1.0  # seconds between solver runs
+    POSITION_SIGNAL: str = "kalman"  # kalman, ewma, median, raw or mean (window mean)
+    POSITION_MAX_AGE: float = 10.0  # ignore filtered pairs not heard for this long
+    POSITION_MAX_GATEWAYS: int = 0  # solve with the N strongest gateways, 0 = all
+    POSITIONING_MODE: str = "trilateration"  # or fingerprint (needs a radio map)
+    FINGERPRINT_MAP_PATH: str = "./radio_map.npz"
+    FINGERPRINT_K: int = 4  # reference points averaged per lookup
+    FINGERPRINT_MISSING_RSSI: float = -105.0  # stands in for unheard gateways
+
+
+settings = Settings()
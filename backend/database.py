@@ -0,0 +1,194 @@
+import logging
+import threading
+from collections.abc import Callable
+
+from core.config import settings
+from models.gateway import Gateway
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import QueuePool
+from sqlmodel import Session, SQLModel, create_engine, delete, select
+
+logger = logging.getLogger(__name__)
+
+_is_sqlite = settings.DATABASE_URL.startswith("sqlite")
+
+engine = create_engine(
+    settings.DATABASE_URL,
+    poolclass=QueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_POOL_SIZE,
+    pool_pre_ping=True,
+    connect_args={"check_same_thread": False} if _is_sqlite else {},
+)
+
+if _is_sqlite:
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, _):
+        # WAL lets API reads proceed while the write-behind thread commits
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+
+
+GATEWAY_FIELDS = ("id", "name", "x", "y", "z")
+
+
+def load_gateways() -> list[tuple[str, str, dict]]:
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        rows = session.exec(select(Gateway)).all()
+    return [
+        (row.gw_type, row.mac_address, {f: getattr(row, f) for f in GATEWAY_FIELDS})
+        for row in rows
+    ]
+
+
+def apply_gateway_changes(
+    upserts: dict[str, Gateway], deletes: list[str]
+) -> dict[str, int]:
+    # One transaction for the whole batch; returns MAC -> id of upserted rows
+    with Session(engine) as session:
+        if deletes:
+            session.exec(delete(Gateway).where(Gateway.mac_address.in_(deletes)))
+        existing = {
+            row.mac_address: row
+            for row in session.exec(
+                select(Gateway).where(Gateway.mac_address.in_(list(upserts)))
+            )
+        }
+        for mac, row in upserts.items():
+            current = existing.get(mac)
+            if current is None:
+                session.add(row)
+                continue
+            for field in ("name", "x", "y", "z", "gw_type"):
+                setattr(current, field, getattr(row, field))
+        session.commit()
+        return {
+            mac: (existing[mac] if mac in existing else row).id
+            for mac, row in upserts.items()
+        }
+
+
+class GatewayWriteBehind:
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # keeps batches in queue order
+        # MAC -> row to upsert, None to delete
+        self._ops: dict[str, Gateway | None] = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.on_flush: Callable[[dict[str, int]], None] | None = None
+        self.flushes = 0
+        self.written = 0
+        self.errors = 0
+        # MAC -> error for changes the database rejected for good (dead letters)
+        self.failed: dict[str, str] = {}
+
+    def upsert(self, gateway: Gateway):
+        with self._lock:
+            self._ops[gateway.mac_address] = gateway
+
+    def delete(self, mac_address: str):
+        with self._lock:
+            self._ops[mac_address] = None
+
+    def pending(self) -> int:
+        return len(self._ops)
+
+    def flush(self):
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        with self._lock:
+            ops, self._ops = self._ops, {}
+        if not ops:
+            return
+        upserts = {mac: row for mac, row in ops.items() if row is not None}
+        deletes = [mac for mac, row in ops.items() if row is None]
+        try:
+            ids = apply_gateway_changes(upserts, deletes)
+        except IntegrityError:
+            # A constraint violation will not go away on retry; find the
+            # offending rows so they do not block everything queued after them
+            self.errors += 1
+            ids = self._apply_each(upserts, deletes)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Gateway write-behind flush failed: %s", e)
+            with self._lock:
+                # Retry next round; anything queued meanwhile is newer and wins
+                self._ops = {**ops, **self._ops}
+            return
+        self.flushes += 1
+        self.written += len(ids) + len(deletes)
+        if self.on_flush is not None and ids:
+            self.on_flush(ids)
+
+    def _apply_each(
+        self, upserts: dict[str, Gateway], deletes: list[str]
+    ) -> dict[str, int]:
+        ids: dict[str, int] = {}
+        retry: dict[str, Gateway | None] = {}
+        try:
+            if deletes:
+                apply_gateway_changes({}, deletes)
+        except Exception as e:
+            logger.warning("Gateway write-behind delete failed: %s", e)
+            retry.update(dict.fromkeys(deletes))
+        for mac, row in upserts.items():
+            try:
+                ids.update(apply_gateway_changes({mac: row}, []))
+            except IntegrityError as e:
+                self.failed[mac] = str(e.orig)
+                logger.error("Dropped gateway write for %s: %s", mac, e.orig)
+            except Exception as e:
+                logger.warning("Gateway write for %s failed: %s", mac, e)
+                retry[mac] = row
+            else:
+                self.failed.pop(mac, None)
+        if retry:
+            with self._lock:
+                self._ops = {**retry, **self._ops}
+        return ids
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="gateway-writer", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending(),
+            "flushes": self.flushes,
+            "written": self.written,
+            "errors": self.errors,
+            "failed": dict(self.failed),
+        }
+
+
+gateway_writer = GatewayWriteBehind(settings.DB_FLUSH_INTERVAL)
@@ -0,0 +1,165 @@
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable
+
+import numpy as np
+
+SIGNALS = ("raw", "median", "ewma", "kalman")
+
+
+class PairFilter:
+    """Filter state for one (beacon, gateway) pair, updated once per sample.
+
+    A Hampel test against the median of the last few raw samples replaces
+    outliers by that median; the cleaned value then feeds an EWMA and a 1-D
+    random-walk Kalman filter. Every update is O(window), with a window of
+    a handful of samples.
+    """
+
+    __slots__ = (
+        "window",
+        "median",
+        "ewma",
+        "kalman",
+        "variance",
+        "last_rssi",
+        "last_ts",
+        "count",
+        "outliers",
+    )
+
+    def __init__(self, window: int):
+        self.window: deque[int] = deque(maxlen=window)
+        self.median = float("nan")
+        self.ewma = float("nan")
+        self.kalman = float("nan")
+        self.variance = 0.0
+        self.last_rssi = 0
+        self.last_ts = 0.0
+        self.count = 0
+        self.outliers = 0
+
+    def update(self, rssi: int, ts: float, bank: "FilterBank"):
+        window = self.window
+        value = float(rssi)
+        if len(window) >= 3:
+            ordered = sorted(window)
+            median = float(ordered[len(ordered) // 2])
+            mad = float(sorted(abs(v - median) for v in ordered)[len(ordered) // 2])
+            # 1.4826 * MAD estimates the noise sigma; a 2 dB floor keeps a
+            # short, quantized window from flagging ordinary jitter
+            if abs(value - median) > bank.hampel_k * max(1.4826 * mad, 2.0):
+                self.outliers += 1
+                value = median
+        window.append(rssi)
+        ordered = sorted(window)
+        self.median = float(ordered[len(ordered) // 2])
+
+        if self.count == 0:
+            self.ewma = self.kalman = value
+            self.variance = bank.kalman_r
+        else:
+            self.ewma += bank.alpha * (value - self.ewma)
+            # Process noise grows with the time since the last sample
+            dt = max(ts - self.last_ts, 0.0)
+            predicted = self.variance + bank.kalman_q * max(dt, 1e-3)
+            gain = predicted / (predicted + bank.kalman_r)
+            self.kalman += gain * (value - self.kalman)
+            self.variance = (1.0 - gain) * predicted
+        self.last_rssi = rssi
+        self.last_ts = ts
+        self.count += 1
+
+    def value(self, signal: str) -> float:
+        if signal == "raw":
+            return float(self.last_rssi)
+        return getattr(self, signal)
+
+    def as_dict(self) -> dict:
+        return {
+            "raw": self.last_rssi,
+            "median": self.median,
+            "ewma": self.ewma,
+            "kalman": self.kalman,
+            "kalman_variance": self.variance,
+            "timestamp": self.last_ts,
+            "samples": self.count,
+            "outliers": self.outliers,
+        }
+
+
+class FilterBank:
+    def __init__(
+        self,
+        alpha: float = 0.3,
+        kalman_q: float = 0.5,
+        kalman_r: float = 4.0,
+        hampel_window: int = 7,
+        hampel_k: float = 3.0,
+    ):
+        self.alpha = alpha
+        self.kalman_q = kalman_q
+        self.kalman_r = kalman_r
+        self.hampel_window = hampel_window
+        self.hampel_k = hampel_k
+        self.beacons: dict[str, dict[str, PairFilter]] = {}
+        self._lock = threading.Lock()
+
+    def update(self, gateway_mac: str, samples: Iterable[tuple[str, int]], ts: float):
+        with self._lock:
+            for mac, rssi in samples:
+                gateways = self.beacons.get(mac)
+                if gateways is None:
+                    gateways = self.beacons[mac] = {}
+                state = gateways.get(gateway_mac)
+                if state is None:
+                    state = gateways[gateway_mac] = PairFilter(self.hampel_window)
+                state.update(rssi, ts, self)
+
+    def sweep(self, idle_before: float | None, evicted: Iterable[str] = ()) -> int:
+        with self._lock:
+            drop = {mac for mac in evicted if mac in self.beacons}
+            if idle_before is not None:
+                drop.update(
+                    mac
+                    for mac, gateways in self.beacons.items()
+                    if max(s.last_ts for s in gateways.values()) < idle_before
+                )
+            for mac in drop:
+                del self.beacons[mac]
+        return len(drop)
+
+    def get(self, mac: str) -> dict[str, dict]:
+        gateways = self.beacons.get(mac, {})
+        return {gateway: state.as_dict() for gateway, state in list(gateways.items())}
+
+    def matrix(
+        self,
+        gateway_macs: list[str],
+        signal: str = "kalman",
+        max_age: float | None = None,
+        now: float | None = None,
+    ) -> tuple[list[str], np.ndarray]:
+        """Filtered RSSI per (beacon, gateway), NaN where unheard or stale."""
+        if signal not in SIGNALS:
+            raise ValueError(f"Unknown signal {signal!r}")
+        column = {mac: i for i, mac in enumerate(gateway_macs)}
+        cutoff = None
+        if max_age is not None:
+            cutoff = (time.time() if now is None else now) - max_age
+        beacons = list(self.beacons.items())
+        matrix = np.full((len(beacons), len(gateway_macs)), np.nan)
+        for row, (_, gateways) in enumerate(beacons):
+            for gateway, state in list(gateways.items()):
+                col = column.get(gateway)
+                if col is None or (cutoff is not None and state.last_ts < cutoff):
+                    continue
+                matrix[row, col] = state.value(signal)
+        return [mac for mac, _ in beacons], matrix
+
+    def stats(self) -> dict:
+        return {
+            "beacons": len(self.beacons),
+            "pairs": sum(len(g) for g in list(self.beacons.values())),
+        }
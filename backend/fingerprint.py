@@ -0,0 +1,200 @@
+import logging
+import os
+import threading
+from collections.abc import Iterable, Mapping
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+logger = logging.getLogger(__name__)
+
+# (x, y, z) of a surveyed spot and the RSSI per gateway heard there
+ReferencePoint = tuple[tuple[float, float, float], Mapping[str, float]]
+
+
+class RadioMap:
+    """Surveyed reference points: a position and the RSSI vector heard there.
+
+    vectors is (P, M) over gateway_macs, NaN where a gateway did not hear the
+    survey tag. Gateways first heard in a later survey add a column.
+    """
+
+    def __init__(
+        self,
+        gateway_macs: list[str] | None = None,
+        coords: np.ndarray | None = None,
+        vectors: np.ndarray | None = None,
+    ):
+        self.gateway_macs = list(gateway_macs or [])
+        m = len(self.gateway_macs)
+        self.coords = np.empty((0, 3)) if coords is None else coords
+        self.vectors = np.empty((0, m)) if vectors is None else vectors
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    def add(self, points: Iterable[ReferencePoint]) -> int:
+        points = list(points)
+        column = {mac: i for i, mac in enumerate(self.gateway_macs)}
+        for _, rssi in points:
+            for mac in rssi:
+                if mac not in column:
+                    column[mac] = len(self.gateway_macs)
+                    self.gateway_macs.append(mac)
+        vectors = np.full((len(points), len(self.gateway_macs)), np.nan)
+        for row, (_, rssi) in enumerate(points):
+            for mac, value in rssi.items():
+                vectors[row, column[mac]] = value
+        grown = np.full((len(self), len(self.gateway_macs)), np.nan)
+        grown[:, : self.vectors.shape[1]] = self.vectors
+        self.vectors = np.vstack([grown, vectors])
+        coords = np.array([xyz for xyz, _ in points], dtype=np.float64).reshape(-1, 3)
+        self.coords = np.vstack([self.coords, coords])
+        return len(points)
+
+    def save(self, path: str):
+        tmp = f"{path}.tmp.npz"
+        np.savez(
+            tmp,
+            gateway_macs=np.array(self.gateway_macs, dtype=str),
+            coords=self.coords,
+            vectors=self.vectors,
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "RadioMap":
+        with np.load(path) as data:
+            return cls(data["gateway_macs"].tolist(), data["coords"], data["vectors"])
+
+    def stats(self) -> dict:
+        return {
+            "points": len(self),
+            "gateways": self.gateway_macs,
+            "bounds": (
+                {
+                    "min": self.coords.min(axis=0).tolist(),
+                    "max": self.coords.max(axis=0).tolist(),
+                }
+                if len(self)
+                else None
+            ),
+        }
+
+
+class FingerprintIndex:
+    """Weighted k-NN over a radio map in gateway RSSI space.
+
+    Uses a scipy KD-tree when scipy is installed, otherwise a chunked NumPy
+    brute-force search. Unheard gateways count as missing_rssi on both sides.
+    """
+
+    def __init__(self, radio_map: RadioMap, missing_rssi: float = -105.0):
+        self.gateway_macs = list(radio_map.gateway_macs)
+        self.missing_rssi = missing_rssi
+        self.coords = radio_map.coords.copy()
+        self.points = np.where(
+            np.isnan(radio_map.vectors), missing_rssi, radio_map.vectors
+        )
+        self.tree = cKDTree(self.points) if cKDTree is not None else None
+        self._norms = np.einsum("pm,pm->p", self.points, self.points)
+
+    def _brute(self, vectors: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        # |a - b|^2 = |a|^2 + |b|^2 - 2 a.b, a few million distances at a time
+        n = len(vectors)
+        distances = np.empty((n, k))
+        indices = np.empty((n, k), dtype=np.int64)
+        step = max(1, 4_000_000 // max(len(self.points), 1))
+        for start in range(0, n, step):
+            chunk = vectors[start : start + step]
+            d2 = (
+                np.einsum("nm,nm->n", chunk, chunk)[:, None]
+                + self._norms[None, :]
+                - 2.0 * chunk @ self.points.T
+            )
+            nearest = np.argpartition(d2, k - 1, axis=1)[:, :k]
+            d = np.take_along_axis(d2, nearest, axis=1)
+            order = np.argsort(d, axis=1)
+            indices[start : start + step] = np.take_along_axis(nearest, order, axis=1)
+            distances[start : start + step] = np.sqrt(
+                np.maximum(np.take_along_axis(d, order, axis=1), 0.0)
+            )
+        return distances, indices
+
+    def query(self, vectors: np.ndarray, k: int = 4) -> tuple[np.ndarray, np.ndarray]:
+        """Positions (N, 3) for RSSI vectors (N, M) in gateway_macs order.
+
+        Also returns the RSSI-space distance to the nearest reference point,
+        a rough confidence measure.
+        """
+        vectors = np.where(np.isnan(vectors), self.missing_rssi, vectors)
+        k = min(k, len(self.points))
+        if len(vectors) == 0 or k == 0:
+            return np.full((len(vectors), 3), np.nan), np.full(len(vectors), np.nan)
+        if self.tree is not None:
+            distances, indices = self.tree.query(vectors, k=k, workers=-1)
+            distances = distances.reshape(len(vectors), k)
+            indices = indices.reshape(len(vectors), k)
+        else:
+            distances, indices = self._brute(vectors, k)
+        weights = 1.0 / np.maximum(distances, 1e-6)
+        positions = np.einsum("nk,nkd->nd", weights, self.coords[indices])
+        positions /= weights.sum(axis=1, keepdims=True)
+        return positions, distances[:, 0]
+
+
+class Fingerprinter:
+    """The radio map on disk plus a lazily rebuilt search index."""
+
+    def __init__(self, path: str, k: int = 4, missing_rssi: float = -105.0):
+        self.path = path
+        self.k = k
+        self.missing_rssi = missing_rssi
+        self.radio_map = RadioMap()
+        if path and os.path.exists(path):
+            try:
+                self.radio_map = RadioMap.load(path)
+                logger.info("Loaded %d fingerprint points from %s", len(self), path)
+            except Exception as e:
+                logger.error("Could not load radio map %s: %s", path, e)
+        self._index: FingerprintIndex | None = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.radio_map)
+
+    def add(self, points: Iterable[ReferencePoint]) -> int:
+        with self._lock:
+            added = self.radio_map.add(points)
+            self._index = None
+            if self.path:
+                self.radio_map.save(self.path)
+        return added
+
+    def clear(self):
+        with self._lock:
+            self.radio_map = RadioMap()
+            self._index = None
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+
+    def index(self) -> FingerprintIndex | None:
+        # Built once per map change, off the event loop by the position task
+        index = self._index
+        if index is None and len(self):
+            with self._lock:
+                if self._index is None:
+                    self._index = FingerprintIndex(self.radio_map, self.missing_rssi)
+                index = self._index
+        return index
+
+    def stats(self) -> dict:
+        return {
+            **self.radio_map.stats(),
+            "k": self.k,
+            "backend": "kdtree" if cKDTree is not None else "numpy",
+        }
@@ -0,0 +1,319 @@
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable, Iterable, Mapping
+from datetime import datetime, timezone
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ("ts", "device", "gateway", "rssi")
+COMPACT_NAME = "compact.npz"
+# Reading an hour while another process compacts it
+READ_ATTEMPTS = 5
+READ_LOCK_WAIT = 10.0
+DTYPES = {"ts": np.float64, "device": np.uint64, "gateway": np.uint64, "rssi": np.int16}
+
+
+def mac_to_int(mac: str) -> int:
+    value = int(mac, 16)
+    # Anything wider would fail the uint64 column, and the whole flush with it
+    if not 0 <= value < 1 << 48:
+        raise ValueError(f"not a 48-bit MAC: {mac!r}")
+    return value
+
+
+def int_to_mac(value: int) -> str:
+    return f"{value:012x}"
+
+
+def _partition(hour: int) -> str:
+    return datetime.fromtimestamp(hour * 3600, timezone.utc).strftime("%Y%m%d/%H")
+
+
+class HistoryWriter:
+    """Hourly-partitioned, compressed column files of raw RSSI samples.
+
+    Each flush writes one part-<ns>-<pid>.npz per hour touched, holding the
+    ts, device, gateway and rssi columns; MACs are stored as 48-bit integers.
+    Once an hour is over, its parts are merged into a single compact.npz
+    sorted by ts, so long range queries open one file per hour.
+    """
+
+    def __init__(
+        self, root: str, flush_interval: float = 10.0, max_buffer: int = 1_000_000
+    ):
+        self.root = root
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buffer: list[tuple[float, int, int, int]] = []
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.written = 0
+        self.dropped = 0
+        self.files = 0
+        self.compactions = 0
+        self.errors = 0
+        self._touched: set[int] = set()  # hours with parts from this writer
+
+    def append(self, gateway_mac: str, samples: list[tuple[str, int]], ts: float):
+        # Ingest path: only convert and buffer, the flush thread does the I/O
+        try:
+            gateway = mac_to_int(gateway_mac)
+        except ValueError:
+            self.dropped += len(samples)
+            return
+        try:
+            rows = [(ts, mac_to_int(mac), gateway, rssi) for mac, rssi in samples]
+        except ValueError:
+            # Rare: redo it one sample at a time and drop only the bad ones
+            rows = []
+            for mac, rssi in samples:
+                try:
+                    rows.append((ts, mac_to_int(mac), gateway, rssi))
+                except ValueError:
+                    self.dropped += 1
+        with self._lock:
+            room = self.max_buffer - len(self._buffer)
+            if room < len(rows):
+                self.dropped += len(rows) - max(room, 0)
+                rows = rows[: max(room, 0)]
+            self._buffer.extend(rows)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return
+            table = np.array(
+                rows,
+                dtype=[(c, DTYPES[c]) for c in COLUMNS],
+            )
+            hours = (table["ts"] // 3600).astype(np.int64)
+            stamp = time.time_ns()
+            for hour in np.unique(hours):
+                part = table[hours == hour]
+                directory = os.path.join(self.root, _partition(int(hour)))
+                os.makedirs(directory, exist_ok=True)
+                # pid keeps parts from several ingest processes apart
+                path = os.path.join(directory, f"part-{stamp}-{os.getpid()}.npz")
+                np.savez_compressed(path, **{c: part[c] for c in COLUMNS})
+                self.files += 1
+                self._touched.add(int(hour))
+            self.written += len(rows)
+
+    def compact_closed(self, now: float | None = None):
+        # Leave a few flush intervals for parts other processes still buffer
+        closed_before = (time.time() if now is None else now) - 3 * self.flush_interval
+        for hour in sorted(self._touched):
+            if (hour + 1) * 3600 > closed_before:
+                continue
+            # One bad hour (a corrupt part, say) must not hold up the others;
+            # it stays touched and is retried next time
+            try:
+                self.compact(hour)
+            except Exception:
+                self.errors += 1
+                logger.exception("History compaction failed for %s", _partition(hour))
+                continue
+            self._touched.discard(hour)
+
+    def compact(self, hour: int) -> bool:
+        """Merge an hour's part files into its compact.npz; False if busy."""
+        directory = os.path.join(self.root, _partition(hour))
+        lock = os.path.join(directory, ".compacting")
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            # Another process is on it, unless it died holding the lock
+            if time.time() - os.path.getmtime(lock) < 600:
+                return False
+            os.remove(lock)
+            return self.compact(hour)
+        except FileNotFoundError:
+            return True
+        os.close(fd)
+        try:
+            parts = sorted(
+                name
+                for name in os.listdir(directory)
+                if name.startswith("part-") and name.endswith(".npz")
+            )
+            if not parts:
+                return True
+            target = os.path.join(directory, COMPACT_NAME)
+            sources = [target] if os.path.exists(target) else []
+            chunks = {c: [] for c in COLUMNS}
+            for path in sources + [os.path.join(directory, n) for n in parts]:
+                with np.load(path) as data:
+                    for c in COLUMNS:
+                        chunks[c].append(data[c])
+            merged = {c: np.concatenate(chunks[c]) for c in COLUMNS}
+            order = np.argsort(merged["ts"], kind="stable")
+            tmp = os.path.join(directory, f".compact-{os.getpid()}.npz")
+            np.savez_compressed(tmp, **{c: merged[c][order] for c in COLUMNS})
+            os.replace(tmp, target)
+            for name in parts:
+                os.remove(os.path.join(directory, name))
+            self.compactions += 1
+            return True
+        finally:
+            os.remove(lock)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            # Anything escaping here would end the thread and stop recording
+            try:
+                self.flush()
+                self.compact_closed()
+            except Exception:
+                self.errors += 1
+                logger.exception("History flush failed")
+
+    def _hours_with_parts(self) -> set[int]:
+        hours = set()
+        if not os.path.isdir(self.root):
+            return hours
+        for day in os.listdir(self.root):
+            for hour in os.listdir(os.path.join(self.root, day)):
+                names = os.listdir(os.path.join(self.root, day, hour))
+                if any(name.startswith("part-") for name in names):
+                    stamp = datetime.strptime(f"{day}{hour}", "%Y%m%d%H")
+                    hours.add(
+                        int(stamp.replace(tzinfo=timezone.utc).timestamp()) // 3600
+                    )
+        return hours
+
+    def start(self):
+        if self._thread is None:
+            # Parts left behind by earlier runs get compacted too
+            self._touched.update(self._hours_with_parts())
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="history-writer", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        self.compact_closed()
+
+    def _hour_directories(self, start: float, end: float) -> Iterable[str]:
+        first, last = _partition(int(start // 3600)), _partition(int(end // 3600))
+        if not os.path.isdir(self.root):
+            return
+        for day in sorted(os.listdir(self.root)):
+            if not first[:8] <= day <= last[:8]:
+                continue
+            for hour in sorted(os.listdir(os.path.join(self.root, day))):
+                if first <= f"{day}/{hour}" <= last:
+                    yield os.path.join(self.root, day, hour)
+
+    @staticmethod
+    def _data_files(directory: str) -> list[str]:
+        # Skip the lock and in-progress compactions (dot files)
+        return sorted(
+            name
+            for name in os.listdir(directory)
+            if name.endswith(".npz") and not name.startswith(".")
+        )
+
+    def partitions(self, start: float, end: float) -> Iterable[str]:
+        for directory in self._hour_directories(start, end):
+            for name in self._data_files(directory):
+                yield os.path.join(directory, name)
+
+    def _read_hour(
+        self, directory: str, read: Callable[[Mapping[str, np.ndarray]], dict]
+    ) -> list[dict]:
+        """read() applied to every file of one hour, as of a single state.
+
+        A compaction in another process can replace the parts mid-read, which
+        would lose rows (a part vanishes) or double them (compact.npz already
+        holds parts not yet deleted). Wait for its lock, then re-read the hour
+        if a file vanished or the lock or the listing changed meanwhile.
+        """
+        lock = os.path.join(directory, ".compacting")
+        for attempt in range(READ_ATTEMPTS):
+            deadline = time.monotonic() + READ_LOCK_WAIT
+            while os.path.exists(lock) and time.monotonic() < deadline:
+                time.sleep(0.05)
+            names = self._data_files(directory)
+            chunks = []
+            try:
+                for name in names:
+                    with np.load(os.path.join(directory, name)) as data:
+                        chunks.append(read(data))
+            except FileNotFoundError:
+                if attempt < READ_ATTEMPTS - 1:
+                    continue
+                logger.warning("History files of %s kept changing", directory)
+                return chunks
+            if not os.path.exists(lock) and self._data_files(directory) == names:
+                break
+        return chunks
+
+    def query(
+        self,
+        start: float,
+        end: float,
+        devices: Iterable[str] | None = None,
+        gateways: Iterable[str] | None = None,
+        columns: Iterable[str] = COLUMNS,
+        limit: int | None = None,
+    ) -> dict[str, np.ndarray]:
+        columns = tuple(columns)
+        device_ids = np.array([mac_to_int(m) for m in devices or ()], dtype=np.uint64)
+        gateway_ids = np.array([mac_to_int(m) for m in gateways or ()], dtype=np.uint64)
+        # Only the partitions in range and the columns we need are decompressed
+        needed = set(columns) | {"ts"}
+        if devices:
+            needed.add("device")
+        if gateways:
+            needed.add("gateway")
+
+        def read(part) -> dict[str, np.ndarray]:
+            data = {c: part[c] for c in needed}
+            keep = (data["ts"] >= start) & (data["ts"] < end)
+            if devices:
+                keep &= np.isin(data["device"], device_ids)
+            if gateways:
+                keep &= np.isin(data["gateway"], gateway_ids)
+            return {c: data[c][keep] for c in needed}
+
+        chunks: dict[str, list[np.ndarray]] = {c: [] for c in columns}
+        total = 0
+        for directory in self._hour_directories(start, end):
+            for data in self._read_hour(directory, read):
+                for c in columns:
+                    chunks[c].append(data[c])
+                total += len(data["ts"])
+            if limit is not None and total >= limit:
+                break
+
+        result = {
+            c: np.concatenate(chunks[c]) if chunks[c] else np.empty(0, DTYPES[c])
+            for c in columns
+        }
+        if limit is not None:
+            result = {c: values[:limit] for c, values in result.items()}
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._buffer),
+            "written": self.written,
+            "dropped": self.dropped,
+            "files": self.files,
+            "compactions": self.compactions,
+            "errors": self.errors,
+        }
@@ -0,0 +1,140 @@
+import logging
+import queue
+import threading
+import time
+from collections.abc import Callable
+
+logger = logging.getLogger(__name__)
+
+DROP_POLICIES = ("drop_newest", "drop_oldest", "block")
+
+Message = tuple[str, bytes, float]  # (topic, payload, recv_time)
+
+
+class IngestQueue:
+    def __init__(
+        self,
+        handler: Callable[[list[Message]], None],
+        maxsize: int = 10000,
+        workers: int = 1,
+        batch_size: int = 100,
+        drop_policy: str = "drop_oldest",
+        block_timeout: float = 0.05,
+    ):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Invalid drop policy {drop_policy!r}")
+        self.handler = handler
+        self.queue: queue.Queue[Message] = queue.Queue(maxsize)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.drop_policy = drop_policy
+        self.block_timeout = block_timeout
+        self._threads: list[threading.Thread] = []
+        self._running = threading.Event()
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.processed = 0
+        self.batches = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.blocked_seconds = 0.0
+        self.last_latency = 0.0
+
+    def put(self, topic: str, payload: bytes, recv_time: float):
+        # Runs on the MQTT network thread: never parse or touch stores here
+        item = (topic, payload, recv_time)
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            if not self._put_full(item):
+                self.dropped += 1
+                return
+        self.enqueued += 1
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def _put_full(self, item: Message) -> bool:
+        if self.drop_policy == "drop_oldest":
+            try:
+                self.queue.get_nowait()
+                self.queue.task_done()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put_nowait(item)
+                return True
+            except queue.Full:
+                return False
+        if self.drop_policy == "block":
+            start = time.perf_counter()
+            try:
+                self.queue.put(item, timeout=self.block_timeout)
+                return True
+            except queue.Full:
+                return False
+            finally:
+                self.blocked_seconds += time.perf_counter() - start
+        return False
+
+    def start(self):
+        if self._running.is_set():
+            return
+        self._running.set()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"ingest-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 1.0):
+        self._running.clear()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _work(self):
+        while self._running.is_set():
+            try:
+                batch = [self.queue.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.handler(batch)
+            except Exception as e:
+                self.errors += 1
+                logger.error("Ingest batch failed: %s", e)
+            self.processed += len(batch)
+            self.batches += 1
+            self.last_latency = time.time() - batch[0][2]
+            for _ in batch:
+                self.queue.task_done()
+
+    def join(self):
+        # Block until every message queued so far has been handled
+        self.queue.join()
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.queue.qsize(),
+            "capacity": self.queue.maxsize,
+            "max_depth": self.max_depth,
+            "workers": self.workers,
+            "batch_size": self.batch_size,
+            "drop_policy": self.drop_policy,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "processed": self.processed,
+            "batches": self.batches,
+            "errors": self.errors,
+            "blocked_seconds": self.blocked_seconds,
+            "last_latency": self.last_latency,
+        }
@@ -0,0 +1,104 @@
+"""Standalone ingest processes for INGEST_MODE=external.
+
+    python ingest_worker.py --processes 4 --host 127.0.0.1 --username ... --password ...
+
+Every process joins the same MQTT v5 shared subscription, so the broker hands
+each gateway message to exactly one of them. Parsed samples go to the Redis
+store that the API workers read from, and are published on the live channel.
+"""
+
+import argparse
+import logging
+import multiprocessing
+import signal
+import threading
+
+import paho.mqtt.client as mqtt
+from core.config import settings
+from database import load_gateways
+from logs import setup_logging
+from registry import MacRegistry
+from utility import DEFAULT_MACS, LIVE_CHANNEL, MQTTManager, sample_store, use_redis
+
+logger = logging.getLogger("ingest_worker")
+
+
+def load_registry() -> MacRegistry:
+    registry = MacRegistry(DEFAULT_MACS)
+    registry.load(load_gateways())
+    return registry
+
+
+def run_worker(index: int, args):
+    setup_logging(settings.LOG_LEVEL, settings.LOG_RATE_LIMIT)
+    manager = MQTTManager(
+        kinds=("status",),
+        store=sample_store(channel=LIVE_CHANNEL),
+        shared_group=args.group,
+        track_state=False,
+    )
+    manager.registry = load_registry()
+    if manager.history is not None:
+        manager.history.start()
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    manager.initialize_mqtt(
+        args.host, args.port, args.username, args.password, protocol=mqtt.MQTTv5
+    )
+    logger.info("Ingest worker %d joined $share/%s", index, args.group)
+    # Gateways added through the API reach us via the database
+    while not stop.wait(settings.REGISTRY_RELOAD_INTERVAL):
+        try:
+            manager.registry = load_registry()
+        except Exception as e:
+            logger.warning("Registry reload failed: %s", e)
+        # Also bounds this process's own index and filter state
+        try:
+            manager.sweep()
+        except Exception as e:
+            logger.warning("Store sweep failed: %s", e)
+
+    manager.mqtt_client.loop_stop()
+    manager.mqtt_client.disconnect()
+    manager.ingest.join()
+    manager.ingest.stop()
+    if manager.history is not None:
+        manager.history.stop()
+    logger.info("Ingest worker %d stopped", index)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=settings.INGEST_PROCESSES)
+    parser.add_argument("--group", default=settings.MQTT_SHARED_GROUP)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--username")
+    parser.add_argument("--password")
+    args = parser.parse_args(argv)
+    if not use_redis():
+        parser.error("set INGEST_MODE=external so the API reads what workers write")
+    setup_logging(settings.LOG_LEVEL, settings.LOG_RATE_LIMIT)
+
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_worker, args=(i, args), name=f"ingest-{i}")
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    signal.signal(signal.SIGTERM, lambda *_: [p.terminate() for p in processes])
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # Children got the SIGINT too and shut down on their own
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import threading
+import time
+from collections.abc import Callable
+
+import codec
+from redis import Redis, RedisError
+
+logger = logging.getLogger(__name__)
+
+
+class LiveClient:
+    def __init__(self, macs: set[str] | None, queue_size: int):
+        self.macs = macs  # None means every MAC
+        self.queue: asyncio.Queue[bytes] = asyncio.Queue(queue_size)
+        self.dropped = 0
+
+    def push(self, frame: bytes):
+        # A slow consumer loses its oldest frame rather than stalling the hub
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(frame)
+
+
+class LiveHub:
+    def __init__(
+        self, rate: float = 2.0, queue_size: int = 10, position_epsilon: float = 0.05
+    ):
+        self.interval = 1.0 / rate
+        self.queue_size = queue_size
+        self.position_epsilon = position_epsilon
+        # Last position sent per MAC; frames only carry what moved since.
+        # Clients that start or widen their filter get a snapshot instead.
+        self._sent: dict[str, tuple[float, float, float]] = {}
+        self._latest: dict[str, dict] = {}
+        self.clients: set[LiveClient] = set()
+        self._lock = threading.Lock()
+        self._samples: dict[str, list[tuple[float, str, int]]] = {}
+        self._positions: dict[str, dict] = {}
+
+    def subscribe(self, macs: set[str] | None = None) -> LiveClient:
+        client = LiveClient(macs, self.queue_size)
+        self.clients.add(client)
+        self._send_snapshot(client, macs)
+        return client
+
+    def set_filter(self, client: LiveClient, macs: set[str] | None):
+        previous, client.macs = client.macs, macs
+        if previous is None:
+            return  # it already had every position
+        # Newly selected MACs may not move again for a long time
+        added = (set(self._latest) if macs is None else macs) - previous
+        if added:
+            self._send_snapshot(client, added)
+
+    def _send_snapshot(self, client: LiveClient, macs: set[str] | None):
+        latest = self._latest
+        if macs is not None:
+            latest = {m: latest[m] for m in macs if m in latest}
+        frame = self._frame(time.time(), {}, latest)
+        if frame is not None:
+            client.push(frame)
+
+    def unsubscribe(self, client: LiveClient):
+        self.clients.discard(client)
+
+    def publish_samples(
+        self, gateway_mac: str, samples: list[tuple[str, int]], ts: float
+    ):
+        # Called from ingest workers; nothing to do while nobody listens
+        if not self.clients or not samples:
+            return
+        with self._lock:
+            pending = self._samples
+            for mac, rssi in samples:
+                pending.setdefault(mac, []).append((ts, gateway_mac, rssi))
+
+    def publish_positions(self, positions: dict[str, dict]):
+        self._latest = positions
+        if not self.clients:
+            return
+        sent = self._sent
+        epsilon = self.position_epsilon
+        changed = {}
+        for mac, position in positions.items():
+            xyz = (position["x"], position["y"], position["z"])
+            last = sent.get(mac)
+            if (
+                last is None
+                or max(abs(a - b) for a, b in zip(xyz, last, strict=True)) > epsilon
+            ):
+                changed[mac] = position
+                sent[mac] = xyz
+        if not changed:
+            return
+        with self._lock:
+            self._positions.update(changed)
+
+    def _take(self) -> tuple[dict, dict]:
+        with self._lock:
+            samples, self._samples = self._samples, {}
+            positions, self._positions = self._positions, {}
+        return samples, positions
+
+    def _frame(self, now: float, samples: dict, positions: dict) -> bytes | None:
+        if not samples and not positions:
+            return None
+        return codec.dumps({"ts": now, "samples": samples, "positions": positions})
+
+    def flush(self):
+        samples, positions = self._take()
+        if not samples and not positions:
+            return
+        now = time.time()
+        shared = None
+        for client in list(self.clients):
+            if client.macs is None:
+                if shared is None:
+                    shared = self._frame(now, samples, positions)
+                frame = shared
+            else:
+                frame = self._frame(
+                    now,
+                    {m: samples[m] for m in client.macs if m in samples},
+                    {m: positions[m] for m in client.macs if m in positions},
+                )
+            if frame is not None:
+                client.push(frame)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self.clients),
+            "interval": self.interval,
+            "dropped_frames": sum(c.dropped for c in self.clients),
+        }
+
+
+class RedisLiveRelay:
+    """Replay the samples external ingest processes publish into this process.
+
+    on_samples receives (gateway_mac, samples, ts) like LiveHub.publish_samples.
+    """
+
+    def __init__(
+        self,
+        client: Redis,
+        channel: str,
+        on_samples: Callable[[str, list[tuple[str, int]], float], None],
+    ):
+        self.client = client
+        self.channel = channel
+        self.on_samples = on_samples
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.relayed = 0
+        self.errors = 0
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    # A bad message must not take the relay thread down with it
+                    try:
+                        data = codec.loads(message["data"])
+                        self.on_samples(
+                            data["gateway"],
+                            [tuple(s) for s in data["samples"]],
+                            data["ts"],
+                        )
+                        self.relayed += 1
+                    except Exception as e:
+                        self.errors += 1
+                        logger.warning("Live relay skipped a message: %r", e)
+            except RedisError as e:
+                logger.warning("Live relay lost Redis: %s", e)
+                self._stop.wait(1.0)
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="live-relay", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {"relayed": self.relayed, "errors": self.errors}
@@ -0,0 +1,45 @@
+import logging
+import threading
+import time
+
+
+class RateLimitFilter(logging.Filter):
+    """Let through one record per message template and interval.
+
+    Hot paths log the same template (e.g. "Ingest batch failed: %s") over and
+    over; the first record passes, the repeats are counted and the count is
+    appended to the next record that gets through.
+    """
+
+    def __init__(self, interval: float = 10.0):
+        super().__init__()
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._state: dict[tuple, list] = {}  # key -> [last emitted, suppressed]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.interval <= 0:
+            return True
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(key)
+            if state is not None and now - state[0] < self.interval:
+                state[1] += 1
+                return False
+            suppressed = state[1] if state is not None else 0
+            self._state[key] = [now, 0]
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+        return True
+
+
+def setup_logging(level: str = "INFO", rate_limit_interval: float = 10.0):
+    handler = logging.StreamHandler()
+    handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    )
+    handler.addFilter(RateLimitFilter(rate_limit_interval))
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level.upper())
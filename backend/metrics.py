@@ -0,0 +1,238 @@
+import bisect
+import threading
+from collections.abc import Callable, Iterable
+
+LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+Labels = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Labels = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def samples(self) -> Iterable[tuple[str, Labels, float]]:
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, value in self.samples():
+            names = self.labelnames
+            extra = ""
+            if suffix == "_bucket":
+                # The last label value of a bucket sample is its upper bound
+                values, le = values[:-1], values[-1]
+                extra = f'le="{le}"'
+            labels = _format_labels(names, values, extra)
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    # Exposed as <name>_total, so register the name without the suffix
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Labels = ()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[Labels, float] = {} if labelnames else {(): 0.0}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [("_total", labels, value) for labels, value in values]
+
+
+class Gauge(Metric):
+    """Set directly, or computed at scrape time when given a callback.
+
+    The callback returns a number, or a mapping of label tuples to numbers.
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Labels = (),
+        callback: Callable[[], float | dict[Labels, float]] | None = None,
+    ):
+        super().__init__(name, help, labelnames)
+        self.callback = callback
+        self._values: dict[Labels, float] = {}
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+    def samples(self):
+        if self.callback is not None:
+            values = self.callback()
+            if not isinstance(values, dict):
+                values = {(): values}
+            return [("", labels, value) for labels, value in values.items()]
+        with self._lock:
+            return [("", labels, value) for labels, value in self._values.items()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Labels = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (+Inf last)], sum
+        self._values: dict[Labels, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            state[0][index] += 1
+            state[1][0] += value
+
+    def samples(self):
+        with self._lock:
+            values = [
+                (labels, list(c), s[0]) for labels, (c, s) in self._values.items()
+            ]
+        result = []
+        bounds = [_format_value(b) for b in self.buckets] + ["+Inf"]
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(bounds, counts, strict=True):
+                cumulative += count
+                result.append(("_bucket", (*labels, bound), cumulative))
+            result.append(("_count", labels, cumulative))
+            result.append(("_sum", labels, total))
+        return result
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def _add(self, metric: Metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Labels = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(
+        self, name: str, help: str, labelnames: Labels = (), callback=None
+    ) -> Gauge:
+        return self._add(Gauge(name, help, labelnames, callback))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Labels = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+registry = MetricsRegistry()
+
+messages_total = registry.counter(
+    "mqtt_messages", "Status messages processed per gateway.", ("gateway",)
+)
+beacons_total = registry.counter(
+    "mqtt_beacons", "Beacon samples stored per gateway.", ("gateway",)
+)
+beacons_rejected_total = registry.counter(
+    "mqtt_beacons_rejected",
+    "Beacon samples dropped before storage, by reason.",
+    ("gateway", "reason"),
+)
+prefiltered_total = registry.counter(
+    "prefilter_removed_beacons",
+    "Beacon samples the gateway filter would remove (dropped unless in shadow mode).",
+    ("gateway", "reason"),
+)
+evictions_total = registry.counter(
+    "rssi_store_evictions",
+    "Beacon MACs evicted from the RSSI store (idle TTL or size cap).",
+    ("reason",),
+)
+connects_total = registry.counter("mqtt_connects", "MQTT (re)connections.")
+reconnects_total = registry.counter(
+    "mqtt_reconnects", "MQTT connections after the first one."
+)
+disconnects_total = registry.counter("mqtt_disconnects", "MQTT disconnections.")
+stage_seconds = registry.histogram(
+    "ingest_stage_seconds",
+    "Time spent per ingest stage (queue wait, parse, store, redis pipeline execute).",
+    ("stage",),
+)
+redis_read_seconds = registry.histogram(
+    "redis_read_seconds",
+    "Round trips reading the RSSI store from Redis (cache misses only).",
+)
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds",
+    "API request latency by route.",
+    ("method", "route", "status"),
+)
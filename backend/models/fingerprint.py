@@ -0,0 +1,17 @@
+from pydantic import BaseModel, Field
+
+
+class CalibrationRequest(BaseModel):
+    mac: str  # the survey tag held at (x, y, z)
+    x: float
+    y: float
+    z: float = 0.0
+    samples: int = Field(default=10, ge=1, le=600)  # vectors recorded, one per interval
+    interval: float = Field(default=1.0, gt=0, le=10)
+
+
+class FingerprintPoint(BaseModel):
+    x: float
+    y: float
+    z: float = 0.0
+    rssi: dict[str, float]  # gateway MAC -> RSSI heard at this point
@@ -0,0 +1,16 @@
+from models.gateway_config import GatewayConfig
+from pydantic import BaseModel, Field
+
+
+class GatewayBatchRequest(BaseModel):
+    macs: list[str] | None = None  # defaults to every registered gateway
+    timeout: float = Field(default=5.0, gt=0, le=60)
+
+
+class ConfigRolloutRequest(BaseModel):
+    config: GatewayConfig
+    macs: list[str] | None = None
+    category: str | None = None  # roll out to a whole group, e.g. "gw"
+    concurrency: int = Field(default=10, ge=1, le=200)
+    timeout: float = Field(default=5.0, gt=0, le=60)
+    retries: int = Field(default=2, ge=0, le=10)
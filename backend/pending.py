@@ -0,0 +1,76 @@
+import asyncio
+import threading
+from collections import deque
+
+# (loop that owns the future, future, gateway MAC)
+Entry = tuple[asyncio.AbstractEventLoop, asyncio.Future, str]
+
+
+class PendingRequests:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures: dict[str, Entry] = {}
+        self._by_gateway: dict[str, deque[str]] = {}
+        self.resolved = 0
+        self.timeouts = 0
+        self.unmatched = 0
+
+    def create(self, request_id: str, gateway_mac: str) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            self._futures[request_id] = (loop, future, gateway_mac)
+            self._by_gateway.setdefault(gateway_mac, deque()).append(request_id)
+        return future
+
+    def _pop(self, request_id: str) -> Entry | None:
+        entry = self._futures.pop(request_id, None)
+        if entry is not None:
+            ids = self._by_gateway[entry[2]]
+            ids.remove(request_id)
+            if not ids:
+                del self._by_gateway[entry[2]]
+        return entry
+
+    def resolve(self, gateway_mac: str, data: dict) -> bool:
+        # Called from ingest workers; futures are completed on their own loop
+        request_id = data.get("requestId") if isinstance(data, dict) else None
+        with self._lock:
+            if request_id is None:
+                # Replies without a requestId answer the oldest open request
+                ids = self._by_gateway.get(gateway_mac)
+                request_id = ids[0] if ids else None
+            entry = self._pop(request_id) if request_id else None
+        if entry is None:
+            self.unmatched += 1
+            return False
+        loop, future, _ = entry
+        loop.call_soon_threadsafe(_set_result, future, data)
+        self.resolved += 1
+        return True
+
+    def discard(self, request_id: str):
+        with self._lock:
+            self._pop(request_id)
+
+    async def wait(self, request_id: str, future: asyncio.Future, timeout: float):
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.discard(request_id)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._futures),
+            "resolved": self.resolved,
+            "timeouts": self.timeouts,
+            "unmatched": self.unmatched,
+        }
+
+
+def _set_result(future: asyncio.Future, data):
+    if not future.done():
+        future.set_result(data)
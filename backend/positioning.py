@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import time
+
+import numpy as np
+from core.config import settings
+from fingerprint import Fingerprinter
+from utility import mqtt_manager
+
+logger = logging.getLogger(__name__)
+
+
+def rssi_to_distance(rssi: np.ndarray, tx_power: float, exponent: float) -> np.ndarray:
+    # Log-distance path-loss model: rssi = tx_power - 10 * n * log10(d)
+    return np.power(10.0, (tx_power - rssi) / (10.0 * exponent))
+
+
+def trilaterate(
+    anchors: np.ndarray, distances: np.ndarray, min_anchors: int = 3
+) -> np.ndarray:
+    """Solve every beacon at once.
+
+    anchors is (M, 3) gateway coordinates, distances is (N, M) with NaN where a
+    gateway did not hear the beacon. Returns (N, 3); rows with fewer than
+    min_anchors usable gateways, or whose gateways cannot fix a point (all on
+    one line, say), are NaN.
+    """
+    anchors = np.asarray(anchors, dtype=np.float64)
+    distances = np.asarray(distances, dtype=np.float64)
+    n = distances.shape[0]
+    positions = np.full((n, 3), np.nan)
+    if n == 0 or anchors.shape[0] == 0:
+        return positions
+
+    valid = np.isfinite(distances)
+    d = np.where(valid, distances, 0.0)
+    # Weight near gateways higher; their range estimate has less error
+    weights = np.where(valid, 1.0 / np.maximum(d, 0.1) ** 2, 0.0)
+    heard = valid.sum(axis=1)
+
+    # Gateways at one height cannot resolve height, so a beacon heard only by
+    # such gateways is solved in their plane; decided per beacon, not per site
+    heights = anchors[:, 2]
+    low = np.where(valid, heights, np.inf).min(axis=1)
+    high = np.where(valid, heights, -np.inf).max(axis=1)
+    planar = high - low < 1e-6
+
+    for dims, rows in ((2, planar), (3, ~planar)):
+        rows = rows & (heard >= max(min_anchors, dims + 1))
+        if not rows.any():
+            continue
+        pts = anchors[:, :dims]
+        # |p - a|^2 = d^2  ->  -2 a.p + |p|^2 = d^2 - |a|^2, linear in (p, |p|^2)
+        design = np.hstack([-2.0 * pts, np.ones((pts.shape[0], 1))])
+        target = d[rows] ** 2 - np.sum(pts**2, axis=1)
+        w = weights[rows]
+        normal = np.einsum("nm,mk,ml->nkl", w, design, design)
+        rhs = np.einsum("nm,mk,nm->nk", w, design, target)
+        # One SVD gives both the solve and the rank. Collinear gateways, or
+        # coplanar ones on a slope, leave a direction unresolved and a least
+        # squares fit would return an arbitrary point on it.
+        u, sv, vt = np.linalg.svd(normal)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            coeff = np.einsum("nml,nm->nl", u, rhs) / sv
+        solution = np.einsum("nlk,nl->nk", vt, coeff)
+        deficient = sv[:, -1] <= sv[:, 0] * (dims + 1) * np.finfo(np.float64).eps
+        solution[deficient] = np.nan
+        positions[rows, :dims] = solution[:, :dims]
+        if dims == 2:
+            positions[rows, 2] = np.where(np.isnan(solution[:, 0]), np.nan, low[rows])
+    return positions
+
+
+class PositionEngine:
+    def __init__(
+        self,
+        tx_power: float = settings.POSITION_TX_POWER,
+        exponent: float = settings.POSITION_PATH_LOSS_EXPONENT,
+        min_gateways: int = settings.POSITION_MIN_GATEWAYS,
+        signal: str = settings.POSITION_SIGNAL,
+        max_age: float = settings.POSITION_MAX_AGE,
+        max_gateways: int = settings.POSITION_MAX_GATEWAYS,
+        mode: str = settings.POSITIONING_MODE,
+    ):
+        self.tx_power = tx_power
+        self.exponent = exponent
+        self.min_gateways = min_gateways
+        self.signal = signal
+        self.max_age = max_age
+        self.max_gateways = max_gateways
+        self.mode = mode
+        self.fingerprinter = Fingerprinter(
+            settings.FINGERPRINT_MAP_PATH,
+            settings.FINGERPRINT_K,
+            settings.FINGERPRINT_MISSING_RSSI,
+        )
+        self.positions: dict[str, dict] = {}
+
+    def load_anchors(self) -> tuple[list[str], np.ndarray]:
+        # Coordinates come from the in-memory registry, never from SQLite
+        snapshot = mqtt_manager.registry.snapshot
+        macs, coords = [], []
+        for mac in sorted(snapshot.gateways):
+            meta = snapshot.metadata[mac]
+            if all(meta.get(axis) is not None for axis in ("x", "y", "z")):
+                macs.append(mac)
+                coords.append((meta["x"], meta["y"], meta["z"]))
+        return macs, np.array(coords, dtype=np.float64).reshape(-1, 3)
+
+    def signal_matrix(self, gateway_macs: list[str]) -> tuple[list[str], np.ndarray]:
+        """RSSI per (beacon, gateway) in the configured signal, NaN if unheard."""
+        if self.signal == "mean":
+            return mqtt_manager.mqtt_data_store.mean_matrix(gateway_macs)
+        # O(1) lookups of the filter state kept current by the ingest path
+        return mqtt_manager.filters.matrix(gateway_macs, self.signal, self.max_age)
+
+    def rssi_matrix(self, gateway_macs: list[str]) -> tuple[list[str], np.ndarray]:
+        beacons, matrix = self.signal_matrix(gateway_macs)
+        if self.max_gateways:
+            self.keep_strongest(beacons, gateway_macs, matrix)
+        return beacons, matrix
+
+    def keep_strongest(self, beacons: list[str], gateway_macs: list[str], matrix):
+        # Far gateways mostly add noise to the least-squares fit
+        column = {mac: i for i, mac in enumerate(gateway_macs)}
+        index = mqtt_manager.index
+        for row, mac in enumerate(beacons):
+            strongest = index.strongest(mac, self.max_gateways, self.max_age)
+            keep = [column[g["gateway"]] for g in strongest if g["gateway"] in column]
+            if len(keep) < np.isfinite(matrix[row]).sum():
+                values = matrix[row, keep]
+                matrix[row] = np.nan
+                matrix[row, keep] = values
+
+    def survey_vector(self, mac: str) -> dict[str, float]:
+        """One beacon's row of the same matrix fingerprint lookups query."""
+        gateway_macs = sorted(
+            mqtt_manager.registry.snapshot.gateways
+            | set(self.fingerprinter.radio_map.gateway_macs)
+        )
+        beacons, matrix = self.signal_matrix(gateway_macs)
+        if mac not in beacons:
+            return {}
+        row = matrix[beacons.index(mac)]
+        return {
+            gateway: float(value)
+            for gateway, value in zip(gateway_macs, row, strict=True)
+            if np.isfinite(value)
+        }
+
+    def solve_trilateration(self) -> tuple[list[str], np.ndarray, np.ndarray]:
+        gateway_macs, anchors = self.load_anchors()
+        beacon_macs, rssi = self.rssi_matrix(gateway_macs)
+        distances = rssi_to_distance(rssi, self.tx_power, self.exponent)
+        solved = trilaterate(anchors, distances, self.min_gateways)
+        return beacon_macs, solved, np.isfinite(rssi).sum(axis=1)
+
+    def solve_fingerprint(self) -> tuple[list[str], np.ndarray, np.ndarray]:
+        index = self.fingerprinter.index()
+        if index is None:
+            return [], np.empty((0, 3)), np.empty(0, dtype=np.int64)
+        # No keep_strongest here: survey vectors keep every gateway too
+        beacon_macs, rssi = self.signal_matrix(index.gateway_macs)
+        heard = np.isfinite(rssi).sum(axis=1)
+        solved = np.full((len(beacon_macs), 3), np.nan)
+        usable = heard >= self.min_gateways
+        # One batched k-NN query for every beacon of this cycle
+        solved[usable], _ = index.query(rssi[usable], self.fingerprinter.k)
+        return beacon_macs, solved, heard
+
+    def update(self) -> dict[str, dict]:
+        if self.mode == "fingerprint":
+            beacon_macs, solved, heard = self.solve_fingerprint()
+        else:
+            beacon_macs, solved, heard = self.solve_trilateration()
+
+        now = time.time()
+        positions = {}
+        for mac, (x, y, z), n in zip(beacon_macs, solved, heard, strict=True):
+            if np.isnan(x):
+                continue
+            positions[mac] = {
+                "mac": mac,
+                "x": float(x),
+                "y": float(y),
+                "z": float(z),
+                "gateways": int(n),
+                "timestamp": now,
+            }
+        self.positions = positions
+        mqtt_manager.live.publish_positions(positions)
+        return positions
+
+    async def run(self, interval: float = settings.POSITION_INTERVAL):
+        while True:
+            try:
+                await asyncio.to_thread(self.update)
+            except Exception as e:
+                logger.error("Position update failed: %s", e)
+            await asyncio.sleep(interval)
+
+
+position_engine = PositionEngine()
@@ -0,0 +1,101 @@
+import re
+import threading
+from functools import lru_cache
+
+from stores import GatewayStore
+
+REASONS = ("rssi", "regex_mac")
+
+
+class BeaconFilter:
+    """The gateway filter (GatewayConfig rssi / regex_mac), evaluated server-side.
+
+    A beacon passes if its RSSI is at least the floor and the regex matches
+    its MAC as the gateway reported it, like the Minew firmware does.
+    """
+
+    __slots__ = ("rssi", "regex_mac", "pattern", "enforce")
+
+    def __init__(
+        self, rssi: int | None = None, regex_mac: str | None = None, enforce=True
+    ):
+        self.rssi = rssi
+        self.regex_mac = regex_mac or None
+        self.pattern = re.compile(regex_mac) if regex_mac else None
+        self.enforce = enforce  # False: only count what it would remove
+
+    def reject(self, mac: str, rssi: int) -> str | None:
+        """The reason this beacon is filtered out, or None if it passes."""
+        if self.rssi is not None and rssi < self.rssi:
+            return "rssi"
+        if self.pattern is not None and self.pattern.search(mac) is None:
+            return "regex_mac"
+        return None
+
+    def as_dict(self) -> dict:
+        return {"rssi": self.rssi, "regex_mac": self.regex_mac, "enforce": self.enforce}
+
+
+@lru_cache(maxsize=1024)
+def compile_filter(
+    rssi: str | int | None, regex_mac: str | None, enforce: bool = True
+) -> BeaconFilter | None:
+    """Raises ValueError for a non-numeric rssi or re.error for a bad regex."""
+    if rssi in (None, "") and not regex_mac:
+        return None
+    return BeaconFilter(None if rssi in (None, "") else int(rssi), regex_mac, enforce)
+
+
+class Prefilter:
+    """Per-gateway server-side filters, with a default for the rest.
+
+    Filters live in a GatewayStore as {"rssi", "regex_mac", "enforce"}, so
+    ingest processes pick up what the API sets. Counters are per process.
+    """
+
+    def __init__(self, store: GatewayStore, default: BeaconFilter | None = None):
+        self.store = store
+        self.default = default
+        self.counts: dict[str, dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def for_gateway(self, gateway_mac: str) -> BeaconFilter | None:
+        params = self.store.get(gateway_mac)
+        if params is None:
+            return self.default
+        return compile_filter(
+            params.get("rssi"), params.get("regex_mac"), params.get("enforce", True)
+        )
+
+    def set(self, gateway_mac: str, beacon_filter: BeaconFilter):
+        self.store[gateway_mac] = beacon_filter.as_dict()
+
+    def remove(self, gateway_mac: str) -> bool:
+        if gateway_mac not in self.store:
+            return False
+        del self.store[gateway_mac]
+        return True
+
+    def record(self, gateway_mac: str, seen: int, removed: dict[str, int]):
+        with self._lock:
+            counts = self.counts.get(gateway_mac)
+            if counts is None:
+                counts = self.counts[gateway_mac] = dict.fromkeys(("seen", *REASONS), 0)
+            counts["seen"] += seen
+            for reason, n in removed.items():
+                counts[reason] += n
+
+    def stats(self, gateway_mac: str) -> dict:
+        beacon_filter = self.for_gateway(gateway_mac)
+        counts = dict(
+            self.counts.get(gateway_mac) or dict.fromkeys(("seen", *REASONS), 0)
+        )
+        removed = sum(counts[reason] for reason in REASONS)
+        return {
+            "gateway_mac": gateway_mac,
+            "filter": beacon_filter.as_dict() if beacon_filter is not None else None,
+            "uses_default": self.store.get(gateway_mac) is None,
+            **counts,
+            "removed": removed,
+            "removed_ratio": removed / counts["seen"] if counts["seen"] else 0.0,
+        }
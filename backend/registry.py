@@ -0,0 +1,108 @@
+import threading
+from collections.abc import Iterable, Mapping
+from types import MappingProxyType
+
+CATEGORIES = ("devices", "gw", "mg3")
+
+
+def normalize_mac(mac: str) -> str:
+    return mac.strip().replace(":", "").replace("-", "").lower()
+
+
+class RegistrySnapshot:
+    __slots__ = ("categories", "owners", "metadata")
+
+    def __init__(self, entries: dict[str, dict[str, dict]]):
+        self.categories = {c: frozenset(macs) for c, macs in entries.items()}
+        self.owners = MappingProxyType(
+            {mac: c for c, macs in entries.items() for mac in macs}
+        )
+        self.metadata = MappingProxyType(
+            {mac: meta for macs in entries.values() for mac, meta in macs.items()}
+        )
+
+    @property
+    def devices(self) -> frozenset[str]:
+        return self.categories["devices"]
+
+    @property
+    def gateways(self) -> frozenset[str]:
+        return self.categories["gw"] | self.categories["mg3"]
+
+
+class MacRegistry:
+    def __init__(self, initial: Mapping[str, Iterable[str]] | None = None):
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict[str, dict]] = {c: {} for c in CATEGORIES}
+        for category, macs in (initial or {}).items():
+            for mac in macs:
+                self._entries[category][normalize_mac(mac)] = {}
+        # Readers on the ingest hot path grab this reference without locking;
+        # every write swaps in a fresh immutable snapshot.
+        self.snapshot = RegistrySnapshot(self._entries)
+
+    def _publish(self):
+        self.snapshot = RegistrySnapshot(self._entries)
+
+    def __contains__(self, mac: str) -> bool:
+        return normalize_mac(mac) in self.snapshot.owners
+
+    def contains(self, category: str, mac: str) -> bool:
+        macs = self.snapshot.categories.get(category)
+        return macs is not None and normalize_mac(mac) in macs
+
+    def category_of(self, mac: str) -> str | None:
+        return self.snapshot.owners.get(normalize_mac(mac))
+
+    def metadata(self, mac: str) -> dict | None:
+        return self.snapshot.metadata.get(normalize_mac(mac))
+
+    def add(self, category: str, mac: str, metadata: dict | None = None) -> str:
+        if category not in self._entries:
+            raise KeyError(category)
+        mac = normalize_mac(mac)
+        with self._lock:
+            if mac in self._entries[category]:
+                raise ValueError(f"MAC address {mac} already exists in {category}.")
+            self._entries[category][mac] = dict(metadata or {})
+            self._publish()
+        return mac
+
+    def remove(self, category: str, mac: str) -> str:
+        mac = normalize_mac(mac)
+        with self._lock:
+            if mac not in self._entries.get(category, {}):
+                raise KeyError(mac)
+            del self._entries[category][mac]
+            self._publish()
+        return mac
+
+    def load(self, entries: Iterable[tuple[str, str, dict]]) -> list[str]:
+        # Upsert many entries but publish a single snapshot
+        loaded = []
+        with self._lock:
+            for category, mac, metadata in entries:
+                if category not in self._entries:
+                    continue
+                mac = normalize_mac(mac)
+                for other, macs in self._entries.items():
+                    if other != category:
+                        macs.pop(mac, None)
+                previous = self._entries[category].get(mac, {})
+                self._entries[category][mac] = {**previous, **metadata}
+                loaded.append(mac)
+            self._publish()
+        return loaded
+
+    def update_metadata(self, updates: Mapping[str, dict]):
+        # Entries removed in the meantime stay removed
+        with self._lock:
+            for mac, metadata in updates.items():
+                category = self.snapshot.owners.get(mac)
+                if category is not None:
+                    current = self._entries[category][mac]
+                    self._entries[category][mac] = {**current, **metadata}
+            self._publish()
+
+    def as_dict(self) -> dict[str, list[str]]:
+        return {c: sorted(macs) for c, macs in self.snapshot.categories.items()}
@@ -0,0 +1,274 @@
+"""Record MQTT gateway traffic and replay it against the ingest pipeline.
+
+    python replay.py record --host 127.0.0.1 --out traffic.jsonl --duration 60
+    python replay.py play traffic.jsonl --speed 10 --target backend
+    python replay.py play traffic.jsonl --speed 0 --target redis
+    python replay.py play traffic.jsonl --target mqtt --host 127.0.0.1
+
+--speed 1 is real time, N is N times faster and 0 is as fast as possible.
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+
+import numpy as np
+import paho.mqtt.client as mqtt
+from topics import WILDCARD_TOPICS
+
+Frame = tuple[float, str, bytes]  # (ts, topic, payload)
+
+
+@dataclass
+class FakeMessage:
+    topic: str
+    payload: bytes
+
+
+def encode_frame(ts: float, topic: str, payload: bytes) -> str:
+    record = {"ts": ts, "topic": topic}
+    try:
+        record["payload"] = payload.decode("utf-8")
+    except UnicodeDecodeError:
+        record["payload_b64"] = base64.b64encode(payload).decode()
+    return json.dumps(record)
+
+
+def read_frames(path: str) -> Iterator[Frame]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "payload_b64" in record:
+                payload = base64.b64decode(record["payload_b64"])
+            else:
+                payload = record["payload"].encode("utf-8")
+            yield record["ts"], record["topic"], payload
+
+
+class Recorder:
+    def __init__(self, path: str):
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def on_message(self, client, userdata, msg):
+        line = encode_frame(time.time(), msg.topic, msg.payload)
+        with self._lock:
+            self._file.write(line + "\n")
+            self.count += 1
+
+    def close(self):
+        self._file.close()
+
+
+def looped(frames: list[Frame], loops: int) -> list[Frame]:
+    """Repeat a recording, shifting each pass to start after the previous one."""
+    if not frames or loops <= 1:
+        return frames
+    span = frames[-1][0] - frames[0][0]
+    # Leave one average gap between the end of a pass and the next start
+    period = span + (span / (len(frames) - 1) if len(frames) > 1 else 0.0)
+    return [
+        (ts + i * period, topic, payload)
+        for i in range(loops)
+        for ts, topic, payload in frames
+    ]
+
+
+def replay(
+    frames: Iterable[Frame], deliver: Callable[[str, bytes], None], speed: float
+) -> tuple[int, float]:
+    # Keep the recorded inter-arrival gaps, scaled by speed
+    count = 0
+    start = time.perf_counter()
+    first_ts = None
+    for ts, topic, payload in frames:
+        if speed > 0:
+            if first_ts is None:
+                first_ts = ts
+            delay = (ts - first_ts) / speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+        deliver(topic, payload)
+        count += 1
+    return count, time.perf_counter() - start
+
+
+def percentiles(latencies: list[float]) -> dict:
+    if not latencies:
+        return {}
+    values = np.array(latencies) * 1000.0
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {
+        "p50_ms": float(p50),
+        "p90_ms": float(p90),
+        "p99_ms": float(p99),
+        "max_ms": float(values.max()),
+    }
+
+
+def play_backend(frames: list[Frame], speed: float) -> dict:
+    from utility import mqtt_manager
+
+    # The topic router drops gateways it does not know; register the recorded ones
+    router = mqtt_manager.topic_router
+    recorded = {router.parse(topic) for _, topic, _ in frames}
+    mqtt_manager.registry.load(
+        (category, mac, {})
+        for category, mac, _ in filter(None, recorded)
+        if category in ("gw", "mg3")
+    )
+
+    latencies: list[float] = []
+    handler = mqtt_manager.ingest.handler
+
+    def timed_handler(batch):
+        handler(batch)
+        done = time.time()
+        latencies.extend(done - recv_time for _, _, recv_time in batch)
+
+    mqtt_manager.ingest.handler = timed_handler
+    mqtt_manager.ingest.start()
+
+    def deliver(topic: str, payload: bytes):
+        mqtt_manager.on_message(None, None, FakeMessage(topic, payload))
+
+    start = time.perf_counter()
+    count, _ = replay(frames, deliver, speed)
+    # Throughput includes draining whatever the workers still have queued
+    mqtt_manager.ingest.join()
+    elapsed = time.perf_counter() - start
+    mqtt_manager.ingest.stop()
+    return {
+        "messages": count,
+        "seconds": elapsed,
+        "msgs_per_s": count / elapsed if elapsed else 0.0,
+        "dropped": mqtt_manager.ingest.dropped,
+        "beacons_stored": len(mqtt_manager.mqtt_data_store),
+        "topics": router.stats(),
+        "failed_messages": mqtt_manager.failed_messages,
+        "latency": percentiles(latencies),
+    }
+
+
+def play_redis(frames: Iterable[Frame], speed: float) -> dict:
+    # The Redis pipeline lives in minew_indoor_position and imports from there
+    package = os.path.join(os.path.dirname(__file__), "..", "minew_indoor_position")
+    sys.path.insert(0, os.path.abspath(package))
+    from db.services import enqueue_many
+    from mqtt_services import parse_samples
+
+    latencies: list[float] = []
+
+    def deliver(topic: str, payload: bytes):
+        start = time.perf_counter()
+        enqueue_many(parse_samples(topic, payload))
+        latencies.append(time.perf_counter() - start)
+
+    count, elapsed = replay(frames, deliver, speed)
+    return {
+        "messages": count,
+        "seconds": elapsed,
+        "msgs_per_s": count / elapsed if elapsed else 0.0,
+        "latency": percentiles(latencies),
+    }
+
+
+def play_mqtt(frames: Iterable[Frame], speed: float, args) -> dict:
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    if args.username:
+        client.username_pw_set(username=args.username, password=args.password)
+    client.connect(args.host, args.port)
+    client.loop_start()
+    latencies: list[float] = []
+
+    def deliver(topic: str, payload: bytes):
+        start = time.perf_counter()
+        client.publish(topic, payload).wait_for_publish()
+        latencies.append(time.perf_counter() - start)
+
+    count, elapsed = replay(frames, deliver, speed)
+    client.loop_stop()
+    client.disconnect()
+    return {
+        "messages": count,
+        "seconds": elapsed,
+        "msgs_per_s": count / elapsed if elapsed else 0.0,
+        "publish_latency": percentiles(latencies),
+    }
+
+
+def record(args):
+    recorder = Recorder(args.out)
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    if args.username:
+        client.username_pw_set(username=args.username, password=args.password)
+    client.on_connect = lambda c, *_: c.subscribe([(t, 0) for t in WILDCARD_TOPICS])
+    client.on_message = recorder.on_message
+    client.connect(args.host, args.port)
+    client.loop_start()
+    try:
+        if args.duration:
+            time.sleep(args.duration)
+        else:
+            threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    client.loop_stop()
+    client.disconnect()
+    recorder.close()
+    print(f"Recorded {recorder.count} messages to {args.out}")
+
+
+def play(args):
+    frames = looped(list(read_frames(args.file)), args.loop)
+    if args.target == "backend":
+        report = play_backend(frames, args.speed)
+    elif args.target == "redis":
+        report = play_redis(frames, args.speed)
+    else:
+        report = play_mqtt(frames, args.speed, args)
+    print(json.dumps(report, indent=2))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def broker_args(p):
+        p.add_argument("--host", default="127.0.0.1")
+        p.add_argument("--port", type=int, default=1883)
+        p.add_argument("--username")
+        p.add_argument("--password")
+
+    rec = sub.add_parser("record", help="capture gateway traffic to a file")
+    broker_args(rec)
+    rec.add_argument("--out", required=True)
+    rec.add_argument("--duration", type=float, default=0, help="seconds, 0 = forever")
+
+    ply = sub.add_parser("play", help="replay a recording")
+    broker_args(ply)
+    ply.add_argument("file")
+    ply.add_argument("--speed", type=float, default=1.0)
+    ply.add_argument("--loop", type=int, default=1, help="repeat the recording")
+    ply.add_argument(
+        "--target", choices=("backend", "redis", "mqtt"), default="backend"
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "record":
+        record(args)
+    else:
+        play(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import asyncio
+import time
+import uuid
+
+from models.gateway_config import GatewayConfig
+
+
+def config_message(config: GatewayConfig, request_id: str) -> dict:
+    return {
+        "action": "config",
+        "takeEffectImmediately": "YES",
+        "filter": {
+            "params": {
+                "rssi": config.rssi,
+                "regex_mac": config.regex_mac,
+            }
+        },
+        "requestId": request_id,
+    }
+
+
+def merge_filter(full_config: dict, config: GatewayConfig) -> dict:
+    # Only the rssi and regex_mac in the filter section change
+    filter_params = full_config.setdefault("filter", {}).setdefault("params", {})
+    if config.rssi is not None:
+        filter_params["rssi"] = config.rssi
+    if config.regex_mac is not None:
+        filter_params["regex_mac"] = config.regex_mac
+    return full_config
+
+
+class ConfigRollout:
+    def __init__(
+        self,
+        category_of: dict[str, str],
+        config: GatewayConfig,
+        concurrency: int,
+        timeout: float,
+        retries: int,
+    ):
+        self.job_id = str(uuid.uuid4())
+        self.config = config
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.created_at = time.time()
+        self.finished_at: float | None = None
+        self.category_of = category_of
+        self.gateways = {
+            mac: {"status": "pending", "attempts": 0, "error": None, "acked_at": None}
+            for mac in category_of
+        }
+
+    async def _apply(self, manager, semaphore: asyncio.Semaphore, mac: str):
+        state = self.gateways[mac]
+        async with semaphore:
+            state["status"] = "sent"
+            state["attempts"] += 1
+            message = config_message(self.config, str(uuid.uuid4()))
+            try:
+                response = await manager.request_action(
+                    self.category_of[mac], mac, message, self.timeout
+                )
+            except asyncio.TimeoutError:
+                state["status"], state["error"] = "timeout", "no acknowledgement"
+                return
+            except Exception as e:
+                state["status"], state["error"] = "failed", str(e)
+                return
+        code = response.get("code", 200) if isinstance(response, dict) else 200
+        if code != 200:
+            state["status"] = "failed"
+            state["error"] = f"gateway answered with code {code}"
+            return
+        state.update(status="acked", error=None, acked_at=time.time())
+        stored = manager.gateway_config_store.get(mac)
+        if stored is not None:
+            # Write back: the store may be shared rather than a local dict
+            manager.gateway_config_store[mac] = merge_filter(stored, self.config)
+
+    async def run(self, manager):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # First pass covers everyone; later passes only retry the stragglers
+        for _ in range(1 + self.retries):
+            todo = [m for m, s in self.gateways.items() if s["status"] != "acked"]
+            if not todo:
+                break
+            await asyncio.gather(*(self._apply(manager, semaphore, m) for m in todo))
+        self.finished_at = time.time()
+
+    def summary(self) -> dict:
+        counts: dict[str, int] = {}
+        for state in self.gateways.values():
+            counts[state["status"]] = counts.get(state["status"], 0) + 1
+        return {
+            "job_id": self.job_id,
+            "done": self.finished_at is not None,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "total": len(self.gateways),
+            "counts": counts,
+            "config": self.config.model_dump(),
+            "gateways": self.gateways,
+        }
+
+
+class RolloutManager:
+    def __init__(self, max_jobs: int = 100):
+        self.max_jobs = max_jobs
+        self.jobs: dict[str, ConfigRollout] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def start(self, manager, job: ConfigRollout) -> ConfigRollout:
+        # Forget the oldest finished jobs so the table stays bounded
+        finished = [j for j in self.jobs.values() if j.finished_at is not None]
+        for old in finished[: max(0, len(self.jobs) + 1 - self.max_jobs)]:
+            del self.jobs[old.job_id]
+        self.jobs[job.job_id] = job
+        task = asyncio.create_task(job.run(manager))
+        self._tasks[job.job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.job_id, None))
+        return job
+
+    def get(self, job_id: str) -> ConfigRollout | None:
+        return self.jobs.get(job_id)
+
+
+rollout_manager = RolloutManager()
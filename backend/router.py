@@ -1,37 +1,338 @@
-import json
+import asyncio
+import bisect
+import re
 import uuid
-
-from fastapi import APIRouter, HTTPException
+from typing import Literal
+
+import codec
+import metrics
+from bulk import parse_csv, to_csv, validate_rows
+from database import apply_gateway_changes, gateway_writer
+from fastapi import APIRouter, HTTPException, Query, Request, Response, WebSocket
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from history import COLUMNS as HISTORY_COLUMNS
+from history import int_to_mac
+from models.fingerprint import CalibrationRequest, FingerprintPoint
 from models.gateway import Gateway
 from models.gateway_config import GatewayConfig
+from models.gateway_request import ConfigRolloutRequest, GatewayBatchRequest
 from models.mac_address import MACAddress
-from sqlmodel import Session, create_engine
+from positioning import position_engine
+from prefilter import compile_filter
+from registry import normalize_mac
+from rollout import ConfigRollout, config_message, merge_filter, rollout_manager
+from rssi_store import RECORD_FIELDS
+from sqlalchemy.exc import IntegrityError
 from utility import mqtt_manager
 
-DATABASE_URL = "sqlite:///./gateway_data.db"
-engine = create_engine(DATABASE_URL)
 combined_router = APIRouter()
 
 
 @combined_router.get("/macs")
 async def get_macs():
-    return mqtt_manager.mac_data
+    return mqtt_manager.registry.as_dict()
+
+
+def _parse_fields(fields: str | None) -> tuple[str, ...]:
+    if not fields:
+        return RECORD_FIELDS
+    selected = tuple(f.strip() for f in fields.split(",") if f.strip())
+    unknown = set(selected) - set(RECORD_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields {sorted(unknown)}. Choose from {list(RECORD_FIELDS)}.",
+        )
+    return selected
+
+
+def _select_macs(cursor: str | None, prefix: str | None) -> list[str]:
+    macs = sorted(mqtt_manager.mqtt_data_store)
+    if prefix:
+        prefix = prefix.lower()
+        start = bisect.bisect_left(macs, prefix)
+        end = bisect.bisect_left(macs, prefix + "\uffff")
+        macs = macs[start:end]
+    if cursor:
+        macs = macs[bisect.bisect_right(macs, cursor.lower()) :]
+    return macs
+
+
+def _encode_page(macs, limit, since, until, fields) -> bytes:
+    store = mqtt_manager.mqtt_data_store
+    data = {}
+    for mac in macs[:limit]:
+        records = store.records(mac, since, until, fields)
+        if records:
+            data[mac] = records
+    next_cursor = macs[limit - 1] if len(macs) > limit else None
+    return codec.dumps({"data": data, "next_cursor": next_cursor})
+
+
+def _iter_ndjson(macs, since, until, fields):
+    # Sync generator: Starlette iterates it in the threadpool, off the event loop
+    store = mqtt_manager.mqtt_data_store
+    for mac in macs:
+        if mac not in store:
+            continue
+        records = store.records(mac, since, until, fields)
+        if records:
+            yield codec.dumps({"mac": mac, "samples": records}) + b"\n"
 
 
 @combined_router.get("/macs/data/all")
-async def get_all_mac_data():
+async def get_all_mac_data(
+    cursor: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    prefix: str | None = None,
+    since: float | None = None,
+    until: float | None = None,
+    fields: str | None = None,
+    format: Literal["json", "ndjson"] = "json",
+):
     if not mqtt_manager.mqtt_data_store:
         raise HTTPException(status_code=404, detail="No data found in mqtt_data_store.")
-    return mqtt_manager.mqtt_data_store  # Return the entire store
+    selected = _parse_fields(fields)
+    macs = await run_in_threadpool(_select_macs, cursor, prefix)
+
+    if format == "ndjson":
+        return StreamingResponse(
+            _iter_ndjson(macs, since, until, selected),
+            media_type="application/x-ndjson",
+        )
+    body = await run_in_threadpool(_encode_page, macs, limit, since, until, selected)
+    return Response(content=body, media_type="application/json")
 
 
 @combined_router.get("/macs/data/{mac}")
-async def get_mac_data(mac: str):
+async def get_mac_data(
+    mac: str,
+    since: float | None = None,
+    until: float | None = None,
+    fields: str | None = None,
+):
     if mac not in mqtt_manager.mqtt_data_store:
         raise HTTPException(
             status_code=404, detail=f"No data found for MAC address {mac}."
         )
-    return mqtt_manager.mqtt_data_store[mac]
+    return mqtt_manager.mqtt_data_store.records(
+        mac, since, until, _parse_fields(fields)
+    )
+
+
+def _query_history(start, end, devices, gateways, columns, limit) -> bytes:
+    result = mqtt_manager.history.query(start, end, devices, gateways, columns, limit)
+    body = {}
+    for column, values in result.items():
+        if column in ("device", "gateway"):
+            body[column] = [int_to_mac(v) for v in values.tolist()]
+        else:
+            body[column] = values.tolist()
+    return codec.dumps(body)
+
+
+@combined_router.get("/history")
+async def get_history(
+    start: float,
+    end: float,
+    device: str | None = None,
+    gateway: str | None = None,
+    columns: str | None = None,
+    limit: int = Query(100_000, ge=1, le=1_000_000),
+):
+    if mqtt_manager.history is None:
+        raise HTTPException(status_code=404, detail="RSSI history is not enabled.")
+    selected = tuple(columns.split(",")) if columns else HISTORY_COLUMNS
+    if not set(selected) <= set(HISTORY_COLUMNS):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown columns. Choose from {list(HISTORY_COLUMNS)}.",
+        )
+    devices = sorted(_parse_macs(device) or ())
+    gateways = sorted(_parse_macs(gateway) or ())
+    try:
+        body = await run_in_threadpool(
+            _query_history, start, end, devices, gateways, selected, limit
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid MAC address filter.")
+    return Response(content=body, media_type="application/json")
+
+
+@combined_router.get("/metrics")
+async def get_metrics():
+    body = await run_in_threadpool(metrics.registry.render)
+    return Response(content=body, media_type=metrics.CONTENT_TYPE)
+
+
+@combined_router.get("/ingest/stats")
+async def get_ingest_stats():
+    return {
+        **mqtt_manager.ingest.stats(),
+        "failed_messages": mqtt_manager.failed_messages,
+        "topics": mqtt_manager.topic_router.stats(),
+        "pending_requests": mqtt_manager.pending.stats(),
+        "gateway_writes": gateway_writer.stats(),
+        "history": mqtt_manager.history.stats() if mqtt_manager.history else None,
+        "index": mqtt_manager.index.stats(),
+        "filters": mqtt_manager.filters.stats(),
+        "relay": mqtt_manager.relay.stats() if mqtt_manager.relay else None,
+        "sweep": mqtt_manager.last_sweep,
+    }
+
+
+@combined_router.get("/beacons/{mac}/gateways")
+async def get_beacon_gateways(
+    mac: str, n: int = Query(3, ge=1, le=100), max_age: float | None = None
+):
+    gateways = mqtt_manager.index.strongest(normalize_mac(mac), n, max_age)
+    if not gateways:
+        raise HTTPException(
+            status_code=404, detail=f"No gateway has heard MAC address {mac}."
+        )
+    return gateways
+
+
+@combined_router.get("/gateway/{gateway_mac}/beacons")
+async def get_gateway_beacons(gateway_mac: str, max_age: float | None = None):
+    return mqtt_manager.index.near(normalize_mac(gateway_mac), max_age)
+
+
+@combined_router.get("/filters/{mac}")
+async def get_filtered_rssi(mac: str):
+    state = mqtt_manager.filters.get(normalize_mac(mac))
+    if not state:
+        raise HTTPException(
+            status_code=404, detail=f"No filtered RSSI for MAC address {mac}."
+        )
+    return state
+
+
+def _parse_macs(macs: str | None) -> set[str] | None:
+    if not macs:
+        return None
+    return {m.strip().lower() for m in macs.split(",") if m.strip()}
+
+
+@combined_router.websocket("/live/ws")
+async def live_ws(websocket: WebSocket, macs: str | None = None):
+    await websocket.accept()
+    client = mqtt_manager.live.subscribe(_parse_macs(macs))
+
+    async def send_frames():
+        while True:
+            frame = await client.queue.get()
+            await websocket.send_text(frame.decode())
+
+    async def receive_filters():
+        # Clients may replace their MAC filter with {"macs": [...]} or {"macs": null}
+        while True:
+            message = await websocket.receive_json()
+            selected = message.get("macs")
+            mqtt_manager.live.set_filter(
+                client, {m.lower() for m in selected} if selected else None
+            )
+
+    tasks = [
+        asyncio.create_task(send_frames()),
+        asyncio.create_task(receive_filters()),
+    ]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        mqtt_manager.live.unsubscribe(client)
+
+
+@combined_router.get("/live/sse")
+async def live_sse(request: Request, macs: str | None = None):
+    client = mqtt_manager.live.subscribe(_parse_macs(macs))
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    frame = await asyncio.wait_for(client.queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                yield b"data: " + frame + b"\n\n"
+        finally:
+            mqtt_manager.live.unsubscribe(client)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@combined_router.get("/live/stats")
+async def get_live_stats():
+    return mqtt_manager.live.stats()
+
+
+@combined_router.get("/positions")
+async def get_positions():
+    return position_engine.positions
+
+
+@combined_router.get("/positions/{mac}")
+async def get_position(mac: str):
+    if mac.lower() not in position_engine.positions:
+        raise HTTPException(
+            status_code=404, detail=f"No position found for MAC address {mac}."
+        )
+    return position_engine.positions[mac.lower()]
+
+
+@combined_router.get("/fingerprint/map")
+async def get_radio_map():
+    return {
+        "mode": position_engine.mode,
+        **position_engine.fingerprinter.stats(),
+    }
+
+
+@combined_router.post("/fingerprint/calibrate")
+async def calibrate(request: CalibrationRequest):
+    """Record the survey tag's RSSI vector at a surveyed point, once per interval."""
+    mac = normalize_mac(request.mac)
+    xyz = (request.x, request.y, request.z)
+    points = []
+    for i in range(request.samples):
+        if i:
+            await asyncio.sleep(request.interval)
+        vector = await run_in_threadpool(position_engine.survey_vector, mac)
+        if vector:
+            points.append((xyz, vector))
+    if not points:
+        raise HTTPException(
+            status_code=404, detail=f"No gateway has heard MAC address {mac}."
+        )
+    await run_in_threadpool(position_engine.fingerprinter.add, points)
+    return {
+        "recorded": len(points),
+        "gateways": sorted({gateway for _, vector in points for gateway in vector}),
+        "points": len(position_engine.fingerprinter),
+    }
+
+
+@combined_router.post("/fingerprint/points")
+async def import_fingerprints(points: list[FingerprintPoint]):
+    # Bulk import of a survey taken elsewhere
+    added = await run_in_threadpool(
+        position_engine.fingerprinter.add,
+        [
+            ((p.x, p.y, p.z), {normalize_mac(g): v for g, v in p.rssi.items()})
+            for p in points
+        ],
+    )
+    return {"recorded": added, "points": len(position_engine.fingerprinter)}
+
+
+@combined_router.delete("/fingerprint/map")
+async def clear_radio_map():
+    await run_in_threadpool(position_engine.fingerprinter.clear)
+    return {"message": "Radio map cleared."}
 
 
 @combined_router.post("/macs")
@@ -39,93 +340,243 @@ async def add_mac(mac: MACAddress):
     if mqtt_manager.mqtt_client is None:
         raise HTTPException(status_code=500, detail="MQTT client is not initialized.")
     category = mac.category
-    mac_address = mac.mac_address
-
-    if category not in mqtt_manager.mac_data:
+    if mac.id is not None:
+        taken = [
+            other
+            for other, meta in mqtt_manager.registry.snapshot.metadata.items()
+            if meta.get("id") == mac.id and other != normalize_mac(mac.mac_address)
+        ]
+        if taken:
+            raise HTTPException(
+                status_code=409, detail=f"Gateway id {mac.id} is taken by {taken[0]}."
+            )
+
+    try:
+        mac_address = mqtt_manager.registry.add(
+            category,
+            mac.mac_address,
+            {"id": mac.id, "name": mac.name, "x": mac.x, "y": mac.y, "z": mac.z},
+        )
+    except KeyError:
         raise HTTPException(
             status_code=400, detail="Invalid category. Must be 'gw' or 'mg3'."
         )
-
-    if mac_address in mqtt_manager.mac_data[category]:
+    except ValueError:
         raise HTTPException(
             status_code=400,
-            detail=f"MAC address {mac_address} already exists in {category}.",
+            detail=f"MAC address {mac.mac_address} already exists in {category}.",
         )
 
-    mqtt_manager.mac_data[category].append(mac_address)
-
-    with Session(engine) as session:
-        new_gateway = Gateway(
+    gateway_writer.upsert(
+        Gateway(
             id=mac.id,
-            mac_address=mac.mac_address,
+            mac_address=mac_address,
             name=mac.name,
             x=mac.x,
             y=mac.y,
             z=mac.z,
             gw_type=mac.category,
         )
-        session.add(new_gateway)
-        session.commit()
+    )
 
-    if category == "gw":
-        mqtt_manager.mqtt_client.subscribe(f"/gw/{mac_address}/status")
-        mqtt_manager.mqtt_client.subscribe(f"/gw/{mac_address}/response")
-    elif category == "mg3":
-        mqtt_manager.mqtt_client.subscribe(f"/mg3/{mac_address}/status")
-        mqtt_manager.mqtt_client.subscribe(f"/mg3/{mac_address}/response")
+    mqtt_manager.subscribe_gateway(category, mac_address)
 
     return {"message": f"MAC address {mac_address} added to {category}"}
 
 
+def _import_gateways(gateways: list[Gateway]) -> dict[str, int]:
+    # Earlier single-MAC changes must land first so this batch is not overwritten
+    gateway_writer.flush()
+    return apply_gateway_changes({gw.mac_address: gw for gw in gateways}, [])
+
+
+@combined_router.post("/macs/bulk")
+async def bulk_add_macs(request: Request, upsert: bool = False):
+    if mqtt_manager.mqtt_client is None:
+        raise HTTPException(status_code=500, detail="MQTT client is not initialized.")
+    body = await request.body()
+    if "csv" in request.headers.get("content-type", ""):
+        rows = parse_csv(body.decode("utf-8-sig"))
+    else:
+        try:
+            rows = codec.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body is not valid JSON.")
+        if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+            raise HTTPException(
+                status_code=400, detail="Expected a JSON array of objects."
+            )
+
+    gateways, errors = validate_rows(rows, mqtt_manager.registry.snapshot, upsert)
+    if errors:
+        # Nothing is applied unless the whole batch is valid
+        raise HTTPException(status_code=422, detail=errors)
+    if not gateways:
+        return {"message": "No rows to import.", "imported": 0}
+
+    try:
+        ids = await run_in_threadpool(_import_gateways, gateways)
+    except IntegrityError as e:
+        # Validation ran against the registry; the database can still disagree
+        raise HTTPException(
+            status_code=409, detail=f"Import conflicts with stored gateways: {e.orig}"
+        )
+    # An upsert may move a MAC between gw and mg3; drop the old topics too
+    owners = mqtt_manager.registry.snapshot.owners
+    moved = [
+        (owners[gw.mac_address], gw.mac_address)
+        for gw in gateways
+        if owners.get(gw.mac_address, gw.gw_type) != gw.gw_type
+    ]
+    mqtt_manager.registry.load(
+        (
+            gw.gw_type,
+            gw.mac_address,
+            {
+                "id": ids.get(gw.mac_address),
+                "name": gw.name,
+                "x": gw.x,
+                "y": gw.y,
+                "z": gw.z,
+            },
+        )
+        for gw in gateways
+    )
+    for category, mac in moved:
+        mqtt_manager.unsubscribe_gateway(category, mac)
+    mqtt_manager.subscribe_gateways([(gw.gw_type, gw.mac_address) for gw in gateways])
+    return {
+        "message": f"Imported {len(gateways)} MAC addresses.",
+        "imported": len(gateways),
+    }
+
+
+@combined_router.get("/macs/export")
+async def export_macs(
+    format: Literal["json", "csv"] = "json", category: str | None = None
+):
+    snapshot = mqtt_manager.registry.snapshot
+    rows = [
+        {
+            "category": owner,
+            "mac_address": mac,
+            **{k: snapshot.metadata[mac].get(k) for k in ("id", "name", "x", "y", "z")},
+        }
+        for mac, owner in sorted(snapshot.owners.items())
+        if category is None or owner == category
+    ]
+    if format == "csv":
+        return Response(
+            content=to_csv(rows),
+            media_type="text/csv",
+            headers={"Content-Disposition": "attachment; filename=macs.csv"},
+        )
+    return rows
+
+
 @combined_router.delete("/macs/{category}/{mac_address}")
 async def delete_mac(category: str, mac_address: str):
-    if (
-        category not in mqtt_manager.mac_data
-        or mac_address not in mqtt_manager.mac_data[category]
-    ):
+    try:
+        mac_address = mqtt_manager.registry.remove(category, mac_address)
+    except KeyError:
         raise HTTPException(
             status_code=404,
             detail=f"MAC address {mac_address} not found in {category}.",
         )
 
-    mqtt_manager.mac_data[category].remove(mac_address)
+    # Removed from the database on the next write-behind flush
+    gateway_writer.delete(mac_address)
 
-    # Remove from the database
-    with Session(engine) as session:
-        gateway = session.query(Gateway).filter_by(mac_address=mac_address).first()
-        if gateway:
-            session.delete(gateway)
-            session.commit()
-            print(f"Removed {mac_address} from the database.")
-
-    if category == "gw":
-        mqtt_manager.mqtt_client.unsubscribe(f"/gw/{mac_address}/status")
-        mqtt_manager.mqtt_client.unsubscribe(f"/gw/{mac_address}/response")
-    elif category == "mg3":
-        mqtt_manager.mqtt_client.unsubscribe(f"/mg3/{mac_address}/status")
-        mqtt_manager.mqtt_client.unsubscribe(f"/mg3/{mac_address}/response")
+    mqtt_manager.unsubscribe_gateway(category, mac_address)
 
     return {"message": f"MAC address {mac_address} removed from {category}"}
 
 
-@combined_router.post("/gateway/check-online/{gateway_mac}")
-async def check_gateway(gateway_mac: str):
+def _gateway_category(gateway_mac: str) -> str:
+    category = mqtt_manager.registry.category_of(gateway_mac)
+    if category not in ("gw", "mg3"):
+        raise HTTPException(
+            status_code=404,
+            detail=f"MAC address {gateway_mac} not found in 'gw' or 'mg3'.",
+        )
+    return category
+
+
+def _batch_macs(request: GatewayBatchRequest) -> list[str]:
+    if request.macs is None:
+        return sorted(mqtt_manager.registry.snapshot.gateways)
+    return [normalize_mac(mac) for mac in request.macs]
+
+
+async def _check_online(gateway_mac: str, timeout: float) -> dict:
+    category = _gateway_category(gateway_mac)
     request_id = str(uuid.uuid4())
     message = {"code": 200, "message": "success", "requestId": request_id}
-
-    if gateway_mac in mqtt_manager.mac_data["gw"]:
-        mqtt_manager.mqtt_client.publish(
-            f"/gw/{gateway_mac}/action", json.dumps(message)
+    try:
+        response = await mqtt_manager.request_action(
+            category, gateway_mac, message, timeout
         )
-    elif gateway_mac in mqtt_manager.mac_data["mg3"]:
-        mqtt_manager.mqtt_client.publish(
-            f"/mg3/{gateway_mac}/action", json.dumps(message)
-        )
-    else:
+    except asyncio.TimeoutError:
+        return {
+            "gateway_mac": gateway_mac,
+            "status": "offline",
+            "requestId": request_id,
+        }
+    return {
+        "gateway_mac": gateway_mac,
+        "status": "online",
+        "requestId": request_id,
+        "response": response,
+    }
+
+
+async def _fetch_config(gateway_mac: str, timeout: float) -> dict:
+    category = _gateway_category(gateway_mac)
+    request_id = str(uuid.uuid4())
+    message = {"action": "getConfig", "requestId": request_id}
+    try:
+        await mqtt_manager.request_action(category, gateway_mac, message, timeout)
+    except asyncio.TimeoutError:
         raise HTTPException(
-            status_code=404,
-            detail=f"MAC address {gateway_mac} not found in 'gw' or 'mg3'.",
+            status_code=504,
+            detail=f"Gateway {gateway_mac} did not answer within {timeout}s.",
         )
+    return {
+        "gateway_mac": gateway_mac,
+        "config": mqtt_manager.gateway_config_store.get(gateway_mac),
+    }
+
+
+async def _fan_out(func, macs: list[str], timeout: float) -> dict:
+    results = await asyncio.gather(
+        *(func(mac, timeout) for mac in macs), return_exceptions=True
+    )
+    summary = {}
+    for mac, result in zip(macs, results, strict=True):
+        if isinstance(result, HTTPException):
+            result = {"gateway_mac": mac, "error": result.detail}
+        elif isinstance(result, Exception):
+            result = {"gateway_mac": mac, "error": str(result)}
+        summary[mac] = result
+    return summary
+
+
+@combined_router.post("/gateway/check-online")
+async def check_gateways(request: GatewayBatchRequest):
+    return await _fan_out(_check_online, _batch_macs(request), request.timeout)
+
+
+@combined_router.post("/gateway/check-online/{gateway_mac}")
+async def check_gateway(
+    gateway_mac: str, wait: bool = False, timeout: float = Query(5.0, gt=0, le=60)
+):
+    gateway_mac = normalize_mac(gateway_mac)
+    if wait:
+        return await _check_online(gateway_mac, timeout)
+
+    request_id = str(uuid.uuid4())
+    message = {"code": 200, "message": "success", "requestId": request_id}
+    mqtt_manager.publish_action(_gateway_category(gateway_mac), gateway_mac, message)
 
     return {
         "message": f"Heartbeat message sent to gateway {gateway_mac}",
@@ -135,6 +586,7 @@ async def check_gateway(gateway_mac: str):
 
 @combined_router.get("/gateway/check-online/{gateway_mac}")
 async def get_gateway_status(gateway_mac: str):
+    gateway_mac = normalize_mac(gateway_mac)
     if gateway_mac in mqtt_manager.gateway_response_store:
         response = mqtt_manager.gateway_response_store[gateway_mac]
         return {"gateway_mac": gateway_mac, "status": "online", "response": response}
@@ -142,18 +594,31 @@ async def get_gateway_status(gateway_mac: str):
         return {"gateway_mac": gateway_mac, "status": "offline"}
 
 
+@combined_router.post("/gateway/config/fetch")
+async def fetch_gateway_configs(request: GatewayBatchRequest):
+    return await _fan_out(_fetch_config, _batch_macs(request), request.timeout)
+
+
 @combined_router.get("/gateway/config/{gateway_mac}")
-async def get_gateway_config(gateway_mac: str):
-    if gateway_mac in mqtt_manager.gateway_config_store:
+async def get_gateway_config(
+    gateway_mac: str,
+    wait: bool = False,
+    refresh: bool = False,
+    timeout: float = Query(5.0, gt=0, le=60),
+):
+    gateway_mac = normalize_mac(gateway_mac)
+    if gateway_mac in mqtt_manager.gateway_config_store and not refresh:
         return {
             "gateway_mac": gateway_mac,
             "config": mqtt_manager.gateway_config_store[gateway_mac],
         }
+    if wait:
+        return await _fetch_config(gateway_mac, timeout)
 
     request_id = str(uuid.uuid4())
     message = {"action": "getConfig", "requestId": request_id}
 
-    mqtt_manager.mqtt_client.publish(f"/gw/{gateway_mac}/action", json.dumps(message))
+    mqtt_manager.publish_action("gw", gateway_mac, message)
     return {
         "message": f"Configuration request sent to gateway {gateway_mac}",
         "requestId": request_id,
@@ -162,6 +627,7 @@ async def get_gateway_config(gateway_mac: str):
 
 @combined_router.put("/gateway/config/{gateway_mac}")
 async def set_gateway_config(gateway_mac: str, config: GatewayConfig):
+    gateway_mac = normalize_mac(gateway_mac)
     request_id = str(uuid.uuid4())
 
     # Initialize or retrieve the full config
@@ -170,36 +636,14 @@ async def set_gateway_config(gateway_mac: str, config: GatewayConfig):
     else:
         raise HTTPException(status_code=404, detail="Gateway configuration not found.")
 
-    # Only update the rssi and regex_mac in the filter section
-    filter_params = full_config.get("filter", {}).get("params", {})
-    filter_params["rssi"] = (
-        config.rssi if config.rssi is not None else filter_params.get("rssi")
-    )
-    filter_params["regex_mac"] = (
-        config.regex_mac
-        if config.regex_mac is not None
-        else filter_params.get("regex_mac")
-    )
-
-    # Update the full config with the modified filter params
-    full_config["filter"]["params"] = filter_params
+    full_config = merge_filter(full_config, config)
     mqtt_manager.gateway_config_store[gateway_mac] = full_config
 
     # Prepare the MQTT message to update the configuration
-    message = {
-        "action": "config",
-        "takeEffectImmediately": "YES",
-        "filter": {
-            "params": {
-                "rssi": config.rssi,
-                "regex_mac": config.regex_mac,
-            }
-        },
-        "requestId": request_id,
-    }
+    message = config_message(config, request_id)
 
     # Publish the message to the gateway's action topic
-    mqtt_manager.mqtt_client.publish(f"/gw/{gateway_mac}/action", json.dumps(message))
+    mqtt_manager.publish_action("gw", gateway_mac, message)
 
     # Return the entire updated configuration
     return {
@@ -207,3 +651,92 @@ async def set_gateway_config(gateway_mac: str, config: GatewayConfig):
         "requestId": request_id,
         "config": full_config,
     }
+
+
+@combined_router.get("/gateway/prefilter")
+async def get_prefilters():
+    prefilter = mqtt_manager.prefilter
+    default = prefilter.default
+    gateways = sorted(mqtt_manager.registry.snapshot.gateways | prefilter.counts.keys())
+    return {
+        "default": default.as_dict() if default is not None else None,
+        "gateways": [prefilter.stats(mac) for mac in gateways],
+    }
+
+
+@combined_router.get("/gateway/prefilter/{gateway_mac}")
+async def get_prefilter(gateway_mac: str):
+    return mqtt_manager.prefilter.stats(normalize_mac(gateway_mac))
+
+
+@combined_router.put("/gateway/prefilter/{gateway_mac}")
+async def set_prefilter(gateway_mac: str, config: GatewayConfig, enforce: bool = True):
+    """Filter this gateway's beacons server-side, as GatewayConfig would on the gateway.
+
+    With enforce=false nothing is dropped; the stats only count what the
+    filter would remove, to tune it before pushing it to the gateway.
+    """
+    gateway_mac = normalize_mac(gateway_mac)
+    try:
+        beacon_filter = compile_filter(config.rssi, config.regex_mac, enforce)
+    except (ValueError, re.error) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid filter: {e}")
+    if beacon_filter is None:
+        raise HTTPException(status_code=422, detail="Set 'rssi' and/or 'regex_mac'.")
+    mqtt_manager.prefilter.set(gateway_mac, beacon_filter)
+    return mqtt_manager.prefilter.stats(gateway_mac)
+
+
+@combined_router.delete("/gateway/prefilter/{gateway_mac}")
+async def delete_prefilter(gateway_mac: str):
+    gateway_mac = normalize_mac(gateway_mac)
+    if not mqtt_manager.prefilter.remove(gateway_mac):
+        raise HTTPException(
+            status_code=404, detail=f"No prefilter set for gateway {gateway_mac}."
+        )
+    return {"message": f"Prefilter removed for gateway {gateway_mac}."}
+
+
+@combined_router.post("/gateway/config-jobs", status_code=202)
+async def create_config_job(request: ConfigRolloutRequest):
+    snapshot = mqtt_manager.registry.snapshot
+    if request.macs is not None:
+        macs = [normalize_mac(mac) for mac in request.macs]
+    elif request.category in ("gw", "mg3"):
+        macs = sorted(snapshot.categories[request.category])
+    else:
+        raise HTTPException(
+            status_code=400, detail="Provide 'macs' or a 'category' of 'gw' or 'mg3'."
+        )
+
+    unknown = [mac for mac in macs if snapshot.owners.get(mac) not in ("gw", "mg3")]
+    if unknown:
+        raise HTTPException(
+            status_code=404, detail=f"Unknown gateways: {', '.join(unknown)}."
+        )
+
+    job = ConfigRollout(
+        {mac: snapshot.owners[mac] for mac in macs},
+        request.config,
+        request.concurrency,
+        request.timeout,
+        request.retries,
+    )
+    rollout_manager.start(mqtt_manager, job)
+    return job.summary()
+
+
+@combined_router.get("/gateway/config-jobs")
+async def list_config_jobs():
+    return [
+        {k: v for k, v in job.summary().items() if k != "gateways"}
+        for job in rollout_manager.jobs.values()
+    ]
+
+
+@combined_router.get("/gateway/config-jobs/{job_id}")
+async def get_config_job(job_id: str):
+    job = rollout_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    return job.summary()
@@ -0,0 +1,436 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Sequence
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import codec
+import numpy as np
+import redis
+from stores import TTLCache
+
+LOCAL_TZ = timezone(timedelta(hours=7))
+RECORD_FIELDS = ("timestamp", "mac", "gateway", "rssi")
+
+
+class RssiRingBuffer:
+    __slots__ = ("capacity", "timestamps", "rssi", "gateways", "head", "count")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.rssi = np.zeros(capacity, dtype=np.int16)
+        self.gateways = np.zeros(capacity, dtype=np.int16)
+        self.head = 0  # next slot to write
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, timestamp: float, rssi: int, gateway: int):
+        i = self.head
+        self.timestamps[i] = timestamp
+        self.rssi[i] = rssi
+        self.gateways[i] = gateway
+        self.head = (i + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def segments(self) -> list[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        # Zero-copy views, oldest first; at most two once the buffer has wrapped
+        if self.count < self.capacity:
+            bounds = [(0, self.count)]
+        else:
+            bounds = [(self.head, self.capacity), (0, self.head)]
+        return [
+            (self.timestamps[a:b], self.rssi[a:b], self.gateways[a:b])
+            for a, b in bounds
+            if b > a
+        ]
+
+    def arrays(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        parts = self.segments()
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return self.timestamps[:0], self.rssi[:0], self.gateways[:0]
+        return tuple(np.concatenate(columns) for columns in zip(*parts, strict=True))
+
+    def latest(self) -> tuple[float, int, int] | None:
+        if not self.count:
+            return None
+        i = self.head - 1
+        return float(self.timestamps[i]), int(self.rssi[i]), int(self.gateways[i])
+
+
+def _select(timestamps, rssi, gateways, since, until):
+    if since is None and until is None:
+        return timestamps, rssi, gateways
+    keep = np.ones(len(timestamps), dtype=bool)
+    if since is not None:
+        keep &= timestamps >= since
+    if until is not None:
+        keep &= timestamps < until
+    return timestamps[keep], rssi[keep], gateways[keep]
+
+
+def _format_records(
+    mac: str,
+    timestamps: np.ndarray,
+    rssi: np.ndarray,
+    gateway_names: Callable[[], list[str]],
+    fields: Sequence[str],
+) -> list[dict]:
+    columns = {}
+    if "timestamp" in fields:
+        columns["timestamp"] = [
+            datetime.fromtimestamp(ts, LOCAL_TZ).isoformat()
+            for ts in timestamps.tolist()
+        ]
+    if "mac" in fields:
+        columns["mac"] = [mac] * len(timestamps)
+    if "gateway" in fields:
+        columns["gateway"] = gateway_names()
+    if "rssi" in fields:
+        columns["rssi"] = rssi.tolist()
+    keys = [field for field in RECORD_FIELDS if field in columns]
+    return [
+        dict(zip(keys, row, strict=True))
+        for row in zip(*(columns[k] for k in keys), strict=True)
+    ]
+
+
+def _mean_matrix(rows: list[tuple[np.ndarray, np.ndarray]], m: int) -> np.ndarray:
+    # rows holds (rssi, column) per beacon; column -1 is a gateway we ignore
+    sums = np.zeros((len(rows), m))
+    counts = np.zeros((len(rows), m))
+    for row, (rssi, cols) in enumerate(rows):
+        hit = cols >= 0
+        sums[row] = np.bincount(cols[hit], weights=rssi[hit], minlength=m)
+        counts[row] = np.bincount(cols[hit], minlength=m)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts
+
+
+class RssiStore:
+    def __init__(self, capacity: int = 100, max_macs: int = 0):
+        self.capacity = capacity
+        self.max_macs = max_macs  # 0 = unbounded
+        # Kept in least-recently-written order, so both idle and LRU eviction
+        # only ever look at the front
+        self.buffers: OrderedDict[str, RssiRingBuffer] = OrderedDict()
+        self.gateway_names: list[str] = []
+        self.gateway_ids: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.evictions = {"idle": 0, "lru": 0}
+        self._overflow: list[str] = []  # evicted by the cap, reported by sweep()
+
+    def __len__(self) -> int:
+        return len(self.buffers)
+
+    def __contains__(self, mac: str) -> bool:
+        return mac in self.buffers
+
+    def __iter__(self):
+        return iter(self.buffers)
+
+    def __getitem__(self, mac: str) -> RssiRingBuffer:
+        return self.buffers[mac]
+
+    def items(self):
+        return self.buffers.items()
+
+    def _gateway_id(self, gateway_mac: str) -> int:
+        gateway = self.gateway_ids.get(gateway_mac)
+        if gateway is None:
+            gateway = len(self.gateway_names)
+            self.gateway_names.append(gateway_mac)
+            self.gateway_ids[gateway_mac] = gateway
+        return gateway
+
+    def _buffer(self, mac: str) -> RssiRingBuffer:
+        # Caller holds the lock
+        buffers = self.buffers
+        buffer = buffers.get(mac)
+        if buffer is not None:
+            buffers.move_to_end(mac)
+            return buffer
+        buffer = buffers[mac] = RssiRingBuffer(self.capacity)
+        if self.max_macs and len(buffers) > self.max_macs:
+            self._overflow.append(buffers.popitem(last=False)[0])
+            self.evictions["lru"] += 1
+        return buffer
+
+    def append(
+        self, mac: str, rssi: int, gateway_mac: str, timestamp: float | None = None
+    ):
+        # Ingest workers may write the same beacon concurrently
+        with self._lock:
+            self._buffer(mac).append(
+                time.time() if timestamp is None else timestamp,
+                rssi,
+                self._gateway_id(gateway_mac),
+            )
+
+    def extend(self, gateway_mac: str, samples: Iterable[tuple[str, int]], ts: float):
+        # One lock round for a whole status message
+        with self._lock:
+            gateway = self._gateway_id(gateway_mac)
+            for mac, rssi in samples:
+                self._buffer(mac).append(ts, rssi, gateway)
+
+    def sweep(self, idle_before: float | None) -> list[str]:
+        """Drop beacons not written since idle_before.
+
+        Returns those MACs plus the ones the max_macs cap pushed out since
+        the previous sweep.
+        """
+        idle = []
+        with self._lock:
+            buffers = self.buffers
+            while idle_before is not None and buffers:
+                mac, buffer = next(iter(buffers.items()))
+                latest = buffer.latest()
+                if latest is not None and latest[0] >= idle_before:
+                    break
+                del buffers[mac]
+                idle.append(mac)
+            self.evictions["idle"] += len(idle)
+            overflow, self._overflow = self._overflow, []
+        return idle + overflow
+
+    def pipeline(self):
+        # Writes land immediately; nothing to batch
+        return nullcontext()
+
+    def sample_count(self, mac: str) -> int:
+        buffer = self.buffers.get(mac)
+        return len(buffer) if buffer is not None else 0
+
+    def records(
+        self,
+        mac: str,
+        since: float | None = None,
+        until: float | None = None,
+        fields: Sequence[str] = RECORD_FIELDS,
+    ) -> list[dict]:
+        timestamps, rssi, gateways = _select(*self.buffers[mac].arrays(), since, until)
+        names = self.gateway_names
+        return _format_records(
+            mac,
+            timestamps,
+            rssi,
+            lambda: [names[gw] for gw in gateways.tolist()],
+            fields,
+        )
+
+    def mean_matrix(self, gateway_macs: list[str]) -> tuple[list[str], np.ndarray]:
+        # Mean RSSI per (beacon, gateway) over the whole window, NaN if unheard
+        column = {mac: i for i, mac in enumerate(gateway_macs)}
+        beacons = list(self.buffers.items())
+        # Map the interned gateway ids onto the requested columns
+        lookup = np.array(
+            [column.get(mac, -1) for mac in list(self.gateway_names)], dtype=np.int64
+        )
+        rows = []
+        for _, buffer in beacons:
+            _, rssi, gateways = buffer.arrays()
+            known = gateways < len(lookup)
+            rows.append((rssi[known], lookup[gateways[known]]))
+        return [mac for mac, _ in beacons], _mean_matrix(rows, len(gateway_macs))
+
+
+class RedisRssiStore:
+    """RssiStore on Redis, shared by ingest processes and API workers.
+
+    Each beacon has a capped list <prefix>:<mac> of "ts,gateway,rssi" entries
+    that expires after ttl seconds without writes; the sorted set
+    <prefix>:last_seen indexes the beacons by when they were last heard.
+    Reads are cached for cache_ttl seconds; writes inside pipeline() go out
+    in one round trip.
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        capacity: int = 100,
+        prefix: str = "rssi",
+        channel: str | None = None,
+        cache_ttl: float = 0.5,
+        ttl: float = 0,
+        max_macs: int = 0,
+        observe: Callable[[str, float], None] | None = None,
+    ):
+        self.client = client
+        self.capacity = capacity
+        self.prefix = prefix
+        self.index = f"{prefix}:last_seen"
+        self.channel = channel  # also publish every message's samples here
+        self.ttl = ttl
+        self.max_macs = max_macs
+        self.cache = TTLCache(cache_ttl)
+        self._local = threading.local()
+        self.evictions = {"idle": 0, "lru": 0}
+        self.observe = observe  # (op, seconds) per Redis round trip, op read/write
+
+    def _timed(self, op: str, call: Callable[[], Any]) -> Any:
+        if self.observe is None:
+            return call()
+        start = time.perf_counter()
+        try:
+            return call()
+        finally:
+            self.observe(op, time.perf_counter() - start)
+
+    def _key(self, mac: str) -> str:
+        return f"{self.prefix}:{mac}"
+
+    def _macs(self) -> frozenset[str]:
+        return self.cache.get(
+            "macs",
+            lambda: frozenset(
+                m.decode()
+                for m in self._timed(
+                    "read", lambda: self.client.zrange(self.index, 0, -1)
+                )
+            ),
+        )
+
+    def _entries(self, mac: str) -> list[bytes]:
+        return self.cache.get(
+            mac,
+            lambda: self._timed(
+                "read", lambda: self.client.lrange(self._key(mac), 0, -1)
+            ),
+        )
+
+    def __len__(self) -> int:
+        return len(self._macs())
+
+    def __contains__(self, mac: str) -> bool:
+        return mac in self._macs()
+
+    def __iter__(self):
+        return iter(self._macs())
+
+    @contextmanager
+    def pipeline(self):
+        # Collect every extend() of an ingest batch into a single pipeline
+        if getattr(self._local, "pipe", None) is not None:
+            yield
+            return
+        self._local.pipe = self.client.pipeline(transaction=False)
+        try:
+            yield
+            self._timed("write", self._local.pipe.execute)
+        finally:
+            self._local.pipe = None
+
+    def append(
+        self, mac: str, rssi: int, gateway_mac: str, timestamp: float | None = None
+    ):
+        self.extend(
+            gateway_mac, [(mac, rssi)], time.time() if timestamp is None else timestamp
+        )
+
+    def extend(self, gateway_mac: str, samples: Iterable[tuple[str, int]], ts: float):
+        samples = list(samples)
+        if not samples:
+            return
+        grouped: dict[str, list[str]] = {}
+        for mac, rssi in samples:
+            grouped.setdefault(mac, []).append(f"{ts:.3f},{gateway_mac},{rssi}")
+        batch = getattr(self._local, "pipe", None)
+        pipe = batch if batch is not None else self.client.pipeline(transaction=False)
+        for mac, entries in grouped.items():
+            key = self._key(mac)
+            pipe.rpush(key, *entries)
+            pipe.ltrim(key, -self.capacity, -1)
+            if self.ttl:
+                # Backstop for keys the sweeper never gets to
+                pipe.expire(key, int(self.ttl) + 1)
+        pipe.zadd(self.index, dict.fromkeys(grouped, ts))
+        if self.channel:
+            pipe.publish(
+                self.channel,
+                codec.dumps({"gateway": gateway_mac, "ts": ts, "samples": samples}),
+            )
+        if batch is None:
+            self._timed("write", pipe.execute)
+
+    def sweep(self, idle_before: float | None) -> list[str]:
+        """Drop beacons idle since idle_before, then the oldest beyond max_macs."""
+        idle = []
+        if idle_before is not None:
+            idle = self.client.zrangebyscore(self.index, "-inf", f"({idle_before}")
+        overflow = []
+        if self.max_macs:
+            excess = self.client.zcard(self.index) - len(idle) - self.max_macs
+            if excess > 0:
+                overflow = self.client.zrange(
+                    self.index, len(idle), len(idle) + excess - 1
+                )
+        evicted = idle + overflow
+        if evicted:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.delete(*(self._key(m.decode()) for m in evicted))
+            pipe.zrem(self.index, *evicted)
+            pipe.execute()
+            self.cache.invalidate()
+        self.evictions["idle"] += len(idle)
+        self.evictions["lru"] += len(overflow)
+        return [m.decode() for m in evicted]
+
+    def sample_count(self, mac: str) -> int:
+        return min(len(self._entries(mac)), self.capacity)
+
+    @staticmethod
+    def _parse(entries: list[bytes]) -> tuple[np.ndarray, np.ndarray, list[str]]:
+        if not entries:
+            return np.empty(0), np.empty(0, dtype=np.int16), []
+        ts, gateways, rssi = zip(
+            *(entry.decode().split(",") for entry in entries), strict=True
+        )
+        return (
+            np.array(ts, dtype=np.float64),
+            np.array(rssi, dtype=np.int16),
+            list(gateways),
+        )
+
+    def records(
+        self,
+        mac: str,
+        since: float | None = None,
+        until: float | None = None,
+        fields: Sequence[str] = RECORD_FIELDS,
+    ) -> list[dict]:
+        timestamps, rssi, gateways = self._parse(self._entries(mac))
+        positions = np.arange(len(gateways))
+        timestamps, rssi, positions = _select(timestamps, rssi, positions, since, until)
+        return _format_records(
+            mac,
+            timestamps,
+            rssi,
+            lambda: [gateways[i] for i in positions.tolist()],
+            fields,
+        )
+
+    def mean_matrix(self, gateway_macs: list[str]) -> tuple[list[str], np.ndarray]:
+        column = {mac: i for i, mac in enumerate(gateway_macs)}
+
+        def load():
+            macs = list(self._macs())
+            pipe = self.client.pipeline(transaction=False)
+            for mac in macs:
+                pipe.lrange(self._key(mac), 0, -1)
+            return macs, self._timed("read", pipe.execute)
+
+        macs, windows = self.cache.get("matrix", load)
+        rows = []
+        for entries in windows:
+            _, rssi, gateways = self._parse(entries)
+            cols = np.array([column.get(g, -1) for g in gateways], dtype=np.int64)
+            rows.append((rssi, cols))
+        return macs, _mean_matrix(rows, len(gateway_macs))
@@ -1,28 +1,89 @@
-from fastapi import FastAPI
-from router import combined_router
+import asyncio
+import logging
+import time
 from contextlib import asynccontextmanager
-from utility import mqtt_manager
+
+import metrics
+from core.config import settings
+from database import gateway_writer, load_gateways
+from fastapi import FastAPI, Request
+from live import RedisLiveRelay
+from logs import setup_logging
+from positioning import position_engine
+from router import combined_router
+from utility import LIVE_CHANNEL, mqtt_manager, redis_client
+
+setup_logging(settings.LOG_LEVEL, settings.LOG_RATE_LIMIT)
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    loaded = mqtt_manager.registry.load(load_gateways())
+    logger.info("Loaded %d gateways from the database.", len(loaded))
+    gateway_writer.on_flush = lambda ids: mqtt_manager.registry.update_metadata(
+        {mac: {"id": gateway_id} for mac, gateway_id in ids.items()}
+    )
+    gateway_writer.start()
+    if mqtt_manager.history is not None:
+        mqtt_manager.history.start()
+    relay = None
+    if settings.INGEST_MODE == "external":
+        # Live samples come from the ingest processes through Redis pub/sub
+        relay = RedisLiveRelay(
+            redis_client(), LIVE_CHANNEL, mqtt_manager.observe_samples
+        )
+        relay.start()
+        mqtt_manager.relay = relay
+
     mqtt_manager.initialize_mqtt(
         host="122.8.155.113", port=1883, username="erudite", password="Erud1t3wifi"
     )
-    print("MQTT client started and subscribed.")
+    logger.info("MQTT client started and subscribed.")
+    position_task = asyncio.create_task(position_engine.run(settings.POSITION_INTERVAL))
+    live_task = asyncio.create_task(mqtt_manager.live.run())
+    sweep_task = asyncio.create_task(
+        mqtt_manager.run_sweeper(settings.STORE_SWEEP_INTERVAL)
+    )
 
     yield
 
+    position_task.cancel()
+    live_task.cancel()
+    sweep_task.cancel()
+
     if mqtt_manager.mqtt_client:
         mqtt_manager.mqtt_client.loop_stop()
         mqtt_manager.mqtt_client.disconnect()
-        print("MQTT client disconnected.")
+        mqtt_manager.ingest.stop()
+        logger.info("MQTT client disconnected.")
+
+    if relay is not None:
+        relay.stop()
+    gateway_writer.stop()
+    if mqtt_manager.history is not None:
+        mqtt_manager.history.stop()
 
 
 app = FastAPI(lifespan=lifespan)
 app.include_router(combined_router, tags=["Gateway and MAC Endpoints"])
 
 
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template so /macs/data/{mac} stays a single series
+    route = request.scope.get("route")
+    metrics.http_request_seconds.observe(
+        time.perf_counter() - start,
+        request.method,
+        route.path if route is not None else "unmatched",
+        str(response.status_code),
+    )
+    return response
+
+
 @app.get("/")
 async def root():
     return {"message": "FastAPI and MQTT client are running"}
@@ -0,0 +1,140 @@
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from contextlib import AbstractContextManager
+from typing import Any, Protocol
+
+import codec
+import numpy as np
+from redis import Redis
+
+
+class SampleStore(Protocol):
+    """What the ingest path, the API and positioning need from mqtt_data_store.
+
+    Implemented by rssi_store.RssiStore (process memory) and
+    rssi_store.RedisRssiStore (shared between processes).
+    """
+
+    def __len__(self) -> int: ...
+
+    def __contains__(self, mac: str) -> bool: ...
+
+    def __iter__(self) -> Iterator[str]: ...
+
+    def extend(
+        self, gateway_mac: str, samples: Iterable[tuple[str, int]], ts: float
+    ): ...
+
+    def pipeline(self) -> AbstractContextManager: ...
+
+    def sweep(self, idle_before: float | None) -> list[str]: ...
+
+    def sample_count(self, mac: str) -> int: ...
+
+    def records(
+        self,
+        mac: str,
+        since: float | None = None,
+        until: float | None = None,
+        fields: Sequence[str] = ...,
+    ) -> list[dict]: ...
+
+    def mean_matrix(self, gateway_macs: list[str]) -> tuple[list[str], np.ndarray]: ...
+
+
+class GatewayStore(Protocol):
+    """gateway_response_store / gateway_config_store: gateway MAC -> JSON object.
+
+    A plain dict is the in-memory implementation; RedisHashStore the shared one.
+    """
+
+    def __contains__(self, mac: str) -> bool: ...
+
+    def __getitem__(self, mac: str) -> Any: ...
+
+    def __setitem__(self, mac: str, value: Any): ...
+
+    def __delitem__(self, mac: str): ...
+
+    def get(self, mac: str, default: Any = None) -> Any: ...
+
+
+class TTLCache:
+    """Memoize reads for a short time so hot API paths skip the round trip."""
+
+    def __init__(self, ttl: float, max_entries: int = 10_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: dict[Any, tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, load: Callable[[], Any]):
+        if self.ttl <= 0:
+            return load()
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        value = load()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: e for k, e in self._entries.items() if e[0] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[key] = (now + self.ttl, value)
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "ttl": self.ttl,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class RedisHashStore:
+    """GatewayStore on one Redis hash, values JSON-encoded."""
+
+    def __init__(self, client: Redis, key: str, cache_ttl: float = 0.5):
+        self.client = client
+        self.key = key
+        self.cache = TTLCache(cache_ttl)
+
+    def _load(self, mac: str):
+        raw = self.client.hget(self.key, mac)
+        return None if raw is None else codec.loads(raw)
+
+    def get(self, mac: str, default: Any = None) -> Any:
+        value = self.cache.get(mac, lambda: self._load(mac))
+        return default if value is None else value
+
+    def __contains__(self, mac: str) -> bool:
+        return self.get(mac) is not None
+
+    def __getitem__(self, mac: str) -> Any:
+        value = self.get(mac)
+        if value is None:
+            raise KeyError(mac)
+        return value
+
+    def __setitem__(self, mac: str, value: Any):
+        self.client.hset(self.key, mac, codec.dumps(value))
+        self.cache.invalidate(mac)
+
+    def __delitem__(self, mac: str):
+        if not self.client.hdel(self.key, mac):
+            raise KeyError(mac)
+        self.cache.invalidate(mac)
@@ -0,0 +1,74 @@
+from collections.abc import Callable
+
+GATEWAY_CATEGORIES = ("gw", "mg3")
+TOPIC_KINDS = ("status", "response")
+
+
+def wildcard_topics(kinds: tuple[str, ...] = TOPIC_KINDS) -> list[str]:
+    return [
+        f"/{category}/+/{kind}" for category in GATEWAY_CATEGORIES for kind in kinds
+    ]
+
+
+WILDCARD_TOPICS = wildcard_topics()
+
+Handler = Callable[[str, bytes], None]  # (gateway_mac, payload)
+ParsedTopic = tuple[str, str, str]  # (category, gateway_mac, kind)
+
+
+def gateway_topics(
+    category: str, mac: str, kinds: tuple[str, ...] = TOPIC_KINDS
+) -> list[str]:
+    return [f"/{category}/{mac}/{kind}" for kind in kinds]
+
+
+class TopicRouter:
+    def __init__(self, is_registered: Callable[[str, str], bool], cache_size=4096):
+        self.is_registered = is_registered
+        self.handlers: dict[tuple[str, str], Handler] = {}
+        self.cache_size = cache_size
+        self._parsed: dict[str, ParsedTopic | None] = {}
+        self.routed = 0
+        self.unregistered = 0
+        self.unrouted = 0
+
+    def route(self, category: str, kind: str, handler: Handler):
+        self.handlers[(category, kind)] = handler
+
+    def parse(self, topic: str) -> ParsedTopic | None:
+        # A site only has a few hundred gateway topics, so parse each one once
+        parsed = self._parsed.get(topic, False)
+        if parsed is not False:
+            return parsed
+        parts = topic.split("/")
+        if len(parts) == 4 and not parts[0] and parts[2]:
+            parsed = (parts[1], parts[2].lower(), parts[3])
+        else:
+            parsed = None
+        if len(self._parsed) >= self.cache_size:
+            self._parsed.clear()
+        self._parsed[topic] = parsed
+        return parsed
+
+    def dispatch(self, topic: str, payload: bytes) -> bool:
+        parsed = self.parse(topic)
+        handler = parsed and self.handlers.get((parsed[0], parsed[2]))
+        if handler is None:
+            self.unrouted += 1
+            return False
+        category, mac, _ = parsed
+        if not self.is_registered(category, mac):
+            # Wildcard subscriptions also deliver gateways we do not manage
+            self.unregistered += 1
+            return False
+        handler(mac, payload)
+        self.routed += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "routed": self.routed,
+            "unregistered": self.unregistered,
+            "unrouted": self.unrouted,
+            "cached_topics": len(self._parsed),
+        }
@@ -1,72 +1,405 @@
-import json
+import asyncio
+import logging
+import time
 
-from datetime import datetime, timezone, timedelta
+import codec
+import metrics
 import paho.mqtt.client as mqtt
-from typing import Dict, List
+from beacon_index import BeaconIndex
+from core.config import settings
+from filters import FilterBank
+from history import HistoryWriter
+from ingest import IngestQueue, Message
+from live import LiveHub
+from pending import PendingRequests
+from prefilter import Prefilter, compile_filter
+from redis import Redis
+from registry import MacRegistry
+from rssi_store import RedisRssiStore, RssiStore
+from stores import GatewayStore, RedisHashStore, SampleStore
+from topics import (
+    GATEWAY_CATEGORIES,
+    TOPIC_KINDS,
+    TopicRouter,
+    gateway_topics,
+    wildcard_topics,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MACS = {
+    "devices": ["C300001AA631", "C3000014BBD8"],
+    "gw": ["ac233fc18bef"],
+    "mg3": ["ac233fc160f5", "ac233fc160e3"],
+}
+LIVE_CHANNEL = f"{settings.REDIS_PREFIX}:live"
+
+
+def use_redis() -> bool:
+    # External ingest only works if the API reads what the workers write
+    return settings.STORE_BACKEND == "redis" or settings.INGEST_MODE == "external"
+
+
+def redis_client() -> Redis:
+    return Redis.from_url(settings.REDIS_URL)
+
+
+def _observe_redis(op: str, seconds: float):
+    # Writes are a stage of ingest: the pipeline execute at the end of a batch
+    if op == "write":
+        metrics.stage_seconds.observe(seconds, "redis")
+    else:
+        metrics.redis_read_seconds.observe(seconds)
+
+
+def sample_store(channel: str | None = None) -> SampleStore:
+    if not use_redis():
+        return RssiStore(settings.STORE_CAPACITY, settings.STORE_MAX_MACS)
+    return RedisRssiStore(
+        redis_client(),
+        settings.STORE_CAPACITY,
+        settings.REDIS_PREFIX,
+        channel=channel,
+        cache_ttl=settings.STORE_CACHE_TTL,
+        ttl=settings.STORE_TTL,
+        max_macs=settings.STORE_MAX_MACS,
+        observe=_observe_redis,
+    )
+
+
+def gateway_store(name: str) -> GatewayStore:
+    if not use_redis():
+        return {}
+    return RedisHashStore(
+        redis_client(), f"{settings.REDIS_PREFIX}:{name}", settings.STORE_CACHE_TTL
+    )
+
 
 class MQTTManager:
-    def __init__(self):
+    def __init__(
+        self,
+        kinds: tuple[str, ...] | None = None,
+        store: SampleStore | None = None,
+        shared_group: str | None = None,
+        track_state: bool | None = None,
+    ):
+        external = settings.INGEST_MODE == "external"
+        # Beacon index and filters feed positioning; ingest workers skip them
+        self.track_state = (
+            track_state
+            if track_state is not None
+            else not external or settings.RELAY_STATE
+        )
+        self.relay = None  # RedisLiveRelay, set by the server in external mode
         self.mqtt_client = None
-        self.mqtt_data_store: Dict[str, List[Dict[str, str]]] = {}
-        self.gateway_response_store: Dict[str, str] = {}
-        self.gateway_config_store: Dict[str, str] = {}
-        self.mac_data = {
-            "devices": ["C300001AA631", "C3000014BBD8"],
-            "gw": ["ac233fc18bef"],
-            "mg3": ["ac233fc160f5", "ac233fc160e3"],
-        }
+        self.connects = 0
+        self.failed_messages = 0
+        # In external mode the API only handles gateway replies itself
+        self.kinds = kinds or (("response",) if external else TOPIC_KINDS)
+        self.shared_group = shared_group
+        self.mqtt_data_store = store if store is not None else sample_store()
+        self.gateway_response_store = gateway_store("gateway_response")
+        self.gateway_config_store = gateway_store("gateway_config")
+        self.prefilter = Prefilter(
+            gateway_store("prefilter"),
+            compile_filter(settings.PREFILTER_RSSI, settings.PREFILTER_REGEX_MAC),
+        )
+        self.registry = MacRegistry(DEFAULT_MACS)
+        self.wildcard_subscribe = settings.MQTT_WILDCARD_SUBSCRIBE or bool(shared_group)
+        self.topic_router = TopicRouter(self.is_registered_gateway)
+        for category in GATEWAY_CATEGORIES:
+            self.topic_router.route(category, "status", self.process_data)
+            self.topic_router.route(category, "response", self.process_response)
+        self.pending = PendingRequests()
+        self.history = (
+            HistoryWriter(
+                settings.HISTORY_DIR,
+                settings.HISTORY_FLUSH_INTERVAL,
+                settings.HISTORY_MAX_BUFFER,
+            )
+            if settings.HISTORY_ENABLED
+            else None
+        )
+        self.last_sweep: dict | None = None
+        self.live = LiveHub(
+            settings.LIVE_RATE,
+            settings.LIVE_CLIENT_QUEUE,
+            settings.LIVE_POSITION_EPSILON,
+        )
+        self.index = BeaconIndex(settings.INDEX_PAIR_CAPACITY)
+        self.filters = FilterBank(
+            settings.FILTER_EWMA_ALPHA,
+            settings.FILTER_KALMAN_Q,
+            settings.FILTER_KALMAN_R,
+            settings.FILTER_HAMPEL_WINDOW,
+            settings.FILTER_HAMPEL_K,
+        )
+        self.ingest = IngestQueue(
+            self.handle_batch,
+            maxsize=settings.INGEST_QUEUE_SIZE,
+            workers=settings.INGEST_WORKERS,
+            batch_size=settings.INGEST_BATCH_SIZE,
+            drop_policy=settings.INGEST_DROP_POLICY,
+            block_timeout=settings.INGEST_BLOCK_TIMEOUT,
+        )
 
-    def initialize_mqtt(self, host: str, port: int, username: str, password: str):
-        self.mqtt_client = mqtt.Client()
+    def initialize_mqtt(
+        self,
+        host: str,
+        port: int,
+        username: str,
+        password: str,
+        protocol: int = mqtt.MQTTv311,
+    ):
+        self.mqtt_client = mqtt.Client(
+            mqtt.CallbackAPIVersion.VERSION2, protocol=protocol
+        )
         self.mqtt_client.on_connect = self.on_connect
         self.mqtt_client.on_message = self.on_message
+        self.mqtt_client.on_disconnect = self.on_disconnect
         self.mqtt_client.username_pw_set(username=username, password=password)
         self.mqtt_client.connect(host, port)
+        self.ingest.start()
         self.mqtt_client.loop_start()
-        print("MQTT client initialized:", self.mqtt_client)
+        logger.info("MQTT client connecting to %s:%s", host, port)
+        logger.info("JSON decoder backend: %s", codec.backend)
 
     def on_connect(self, client, userdata, flags, reason_code, properties=None):
-        print(f"Connected with result code {reason_code}")
+        logger.info("Connected with result code %s", reason_code)
+        if self.connects:
+            metrics.reconnects_total.inc()
+        self.connects += 1
+        metrics.connects_total.inc()
         self.subscribe_to_topics()
 
+    def on_disconnect(self, client, userdata, flags, reason_code, properties=None):
+        logger.warning("Disconnected from MQTT broker: %s", reason_code)
+        metrics.disconnects_total.inc()
+
     def on_message(self, client, userdata, msg):
-        data_str = msg.payload.decode("UTF-8")
-        topic = msg.topic
-        if "/response" in topic:
-            gateway_mac = topic.split("/")[2]
-            data = json.loads(data_str)
-            if "currentConfig" in data:
-                self.gateway_config_store[gateway_mac] = data["currentConfig"]
-            else:
-                self.gateway_response_store[gateway_mac] = data
+        self.ingest.put(msg.topic, msg.payload, time.time())
+
+    def handle_batch(self, batch: list[Message]):
+        now = time.time()
+        with self.mqtt_data_store.pipeline():
+            for topic, payload, recv_time in batch:
+                metrics.stage_seconds.observe(now - recv_time, "queue")
+                # One bad payload must not cost the rest of the batch
+                try:
+                    self.handle_message(topic, payload)
+                except Exception as e:
+                    self.failed_messages += 1
+                    logger.warning("Dropped message on %s: %r", topic, e)
+
+    def handle_message(self, topic: str, payload: bytes):
+        self.topic_router.dispatch(topic, payload)
+
+    def is_registered_gateway(self, category: str, mac: str) -> bool:
+        macs = self.registry.snapshot.categories.get(category)
+        return macs is not None and mac in macs
+
+    def process_response(self, gateway_mac: str, payload: bytes):
+        data = codec.loads(payload)
+        if "currentConfig" in data:
+            self.gateway_config_store[gateway_mac] = data["currentConfig"]
         else:
-            self.process_data(data_str)
+            self.gateway_response_store[gateway_mac] = data
+        self.pending.resolve(gateway_mac, data)
+
+    def publish_action(self, category: str, gateway_mac: str, message: dict):
+        self.mqtt_client.publish(
+            f"/{category}/{gateway_mac}/action", codec.dumps(message)
+        )
+
+    async def request_action(
+        self, category: str, gateway_mac: str, message: dict, timeout: float
+    ) -> dict:
+        # Register before publishing so a fast reply cannot slip past us
+        future = self.pending.create(message["requestId"], gateway_mac)
+        try:
+            self.publish_action(category, gateway_mac, message)
+        except Exception:
+            self.pending.discard(message["requestId"])
+            raise
+        return await self.pending.wait(message["requestId"], future, timeout)
 
-    def process_data(self, data_str: str):
-        for data in json.loads(data_str):
-            if data.get("type") == "Gateway":
+    def process_data(self, gateway_mac: str, payload: bytes):
+        now = time.time()
+        started = time.perf_counter()
+        beacons = codec.decode_beacons(payload)
+        parsed = time.perf_counter()
+        # Allow-list mode: passers-by never reach the store
+        allowed = self.registry.snapshot.devices if settings.STORE_ALLOW_LIST else None
+        beacon_filter = self.prefilter.for_gateway(gateway_mac)
+        samples = []
+        seen = rejected = 0
+        removed: dict[str, int] = {}
+        for beacon_type, mac, rssi in beacons:
+            if beacon_type == "Gateway":
                 pass
-            elif data.get("type") is None or data.get("type") == "iBeacon":
-                mac = data.get("mac").lower()
-                self.mqtt_data_store.setdefault(mac, []).append(
-                    {
-                    "timestamp": datetime.now(timezone(timedelta(hours=7))).isoformat(),
-                        "mac": mac,
-                        "rssi": data.get("rssi"),
-                    }
-                )
-                if len(self.mqtt_data_store[mac]) > 100:
-                    self.mqtt_data_store[mac] = self.mqtt_data_store[mac][-100:]
+            elif beacon_type is None or beacon_type == "iBeacon":
+                if mac is not None and rssi is not None:
+                    seen += 1
+                    if beacon_filter is not None:
+                        # Match the MAC as the gateway sees it, before lowercasing
+                        reason = beacon_filter.reject(mac, rssi)
+                        if reason is not None:
+                            removed[reason] = removed.get(reason, 0) + 1
+                            if beacon_filter.enforce:
+                                continue
+                    mac = mac.lower()
+                    if allowed is None or mac in allowed:
+                        samples.append((mac, rssi))
+                    else:
+                        rejected += 1
+        self.prefilter.record(gateway_mac, seen, removed)
+        for reason, n in removed.items():
+            metrics.prefiltered_total.inc(gateway_mac, reason, amount=n)
+        if rejected:
+            metrics.beacons_rejected_total.inc(
+                gateway_mac, "unregistered", amount=rejected
+            )
+        self.mqtt_data_store.extend(gateway_mac, samples, now)
+        metrics.stage_seconds.observe(parsed - started, "parse")
+        metrics.stage_seconds.observe(time.perf_counter() - parsed, "store")
+        metrics.messages_total.inc(gateway_mac)
+        metrics.beacons_total.inc(gateway_mac, amount=len(samples))
+        self.observe_samples(gateway_mac, samples, now)
+        if self.history is not None and samples:
+            self.history.append(gateway_mac, samples, now)
+
+    def observe_samples(
+        self, gateway_mac: str, samples: list[tuple[str, int]], ts: float
+    ):
+        # Also fed by the Redis live relay when ingest runs in other processes
+        if self.track_state:
+            self.index.update(gateway_mac, samples, ts)
+            self.filters.update(gateway_mac, samples, ts)
+        self.live.publish_samples(gateway_mac, samples, ts)
+
+    def sweep(self) -> dict:
+        """Evict idle beacons and enforce the store cap, in every structure."""
+        started = time.time()
+        idle_before = started - settings.STORE_TTL if settings.STORE_TTL else None
+        evicted = self.mqtt_data_store.sweep(idle_before)
+        result = {
+            "timestamp": started,
+            "store": len(evicted),
+            "index": self.index.sweep(idle_before, evicted),
+            "filters": self.filters.sweep(idle_before, evicted),
+            "evictions": dict(self.mqtt_data_store.evictions),
+        }
+        for reason, total in result["evictions"].items():
+            counted = (self.last_sweep or {}).get("evictions", {}).get(reason, 0)
+            if total > counted:
+                metrics.evictions_total.inc(reason, amount=total - counted)
+        if evicted:
+            logger.info(
+                "Evicted %d beacon MACs (%d remain), e.g. %s",
+                len(evicted),
+                len(self.mqtt_data_store),
+                ", ".join(evicted[:5]),
+            )
+        self.last_sweep = result
+        return result
+
+    async def run_sweeper(self, interval: float = settings.STORE_SWEEP_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                logger.error("Store sweep failed: %s", e)
 
     def subscribe_to_topics(self):
-        for mac in self.mac_data["mg3"]:
-            self.mqtt_client.subscribe(f"/mg3/{mac}/status")
-            self.mqtt_client.subscribe(f"/mg3/{mac}/response")
-            print("Subscribed to", f"/mg3/{mac}")
-        for mac in self.mac_data["gw"]:
-            self.mqtt_client.subscribe(f"/gw/{mac}/status")
-            self.mqtt_client.subscribe(f"/gw/{mac}/response")
-            print("Subscribed to", f"/gw/{mac}")
+        if self.wildcard_subscribe:
+            topics = wildcard_topics(self.kinds)
+        else:
+            snapshot = self.registry.snapshot
+            topics = [
+                topic
+                for category in GATEWAY_CATEGORIES
+                for mac in snapshot.categories[category]
+                for topic in gateway_topics(category, mac, self.kinds)
+            ]
+        if self.shared_group:
+            # MQTT v5 shared subscription: the broker splits traffic across the group
+            topics = [f"$share/{self.shared_group}/{topic}" for topic in topics]
+        if topics:
+            # One SUBSCRIBE packet for everything, also after each reconnect
+            self.mqtt_client.subscribe([(topic, 0) for topic in topics])
+        logger.info("Subscribed to %d topics", len(topics))
+
+    def subscribe_gateway(self, category: str, mac: str):
+        self.subscribe_gateways([(category, mac)])
+
+    def subscribe_gateways(self, gateways: list[tuple[str, str]]):
+        if self.wildcard_subscribe:
+            return
+        topics = [
+            (topic, 0)
+            for category, mac in gateways
+            if category in GATEWAY_CATEGORIES
+            for topic in gateway_topics(category, mac, self.kinds)
+        ]
+        if topics:
+            self.mqtt_client.subscribe(topics)
+
+    def unsubscribe_gateway(self, category: str, mac: str):
+        if category in GATEWAY_CATEGORIES and not self.wildcard_subscribe:
+            self.mqtt_client.unsubscribe(gateway_topics(category, mac, self.kinds))
 
 
 mqtt_manager = MQTTManager()
+
+
+def _store_samples() -> dict[tuple[str, ...], float]:
+    # Per-MAC sizes only for registered devices; passers-by would blow up cardinality
+    store = mqtt_manager.mqtt_data_store
+    return {
+        (mac,): store.sample_count(mac)
+        for mac in mqtt_manager.registry.snapshot.devices
+    }
+
+
+metrics.registry.gauge(
+    "ingest_queue_depth",
+    "Messages waiting for an ingest worker.",
+    callback=lambda: mqtt_manager.ingest.queue.qsize(),
+)
+metrics.registry.gauge(
+    "ingest_queue_capacity",
+    "Ingest queue size limit.",
+    callback=lambda: mqtt_manager.ingest.queue.maxsize,
+)
+metrics.registry.gauge(
+    "ingest_dropped_messages",
+    "Messages dropped because the ingest queue was full.",
+    callback=lambda: mqtt_manager.ingest.dropped,
+)
+metrics.registry.gauge(
+    "ingest_failed_batches",
+    "Ingest batches whose handler raised.",
+    callback=lambda: mqtt_manager.ingest.errors,
+)
+metrics.registry.gauge(
+    "ingest_failed_messages",
+    "Messages whose payload could not be processed.",
+    callback=lambda: mqtt_manager.failed_messages,
+)
+metrics.registry.gauge(
+    "rssi_store_macs",
+    "Beacon MACs held in the RSSI store.",
+    callback=lambda: len(mqtt_manager.mqtt_data_store),
+)
+metrics.registry.gauge(
+    "rssi_store_samples",
+    "Samples held per registered device MAC.",
+    ("mac",),
+    callback=_store_samples,
+)
+metrics.registry.gauge(
+    "live_clients",
+    "Connected WebSocket/SSE subscribers.",
+    callback=lambda: len(mqtt_manager.live.clients),
+)
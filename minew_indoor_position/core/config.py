@@ -39,6 +39,10 @@ class Settings(BaseSettings):
     MQTT_HOST: str = "localhost"
     MQTT_PORT: int = 1883
 
+    # Ingest
+    INGEST_QUEUE_SIZE: int = 10000
+    INGEST_BATCH_SIZE: int = 100
+
     # MAC Addresses
     GATEWAY_MACS: Annotated[list[str] | str, BeforeValidator(gateway_parse_cors)] = []
     MG3_MACS: Annotated[list[str] | str, BeforeValidator(gateway_parse_cors)] = []
@@ -1,3 +1,7 @@
+import warnings
+from collections import defaultdict
+from collections.abc import Iterable
+
 import numpy as np
 import redis
 from core.config import settings
@@ -9,11 +13,82 @@ r = redis.Redis(
 max_lenght = settings.MAX_QUEUE_LENGTH
 
 
+def enqueue_many(samples: Iterable[tuple[str, float]]):
+    grouped = defaultdict(list)
+    for key, value in samples:
+        grouped[key].append(value)
+    if not grouped:
+        return
+
+    # Push and trim every key in a single round trip
+    pipe = r.pipeline(transaction=False)
+    for key, values in grouped.items():
+        pipe.rpush(key, *values)
+        pipe.ltrim(key, -max_lenght, -1)
+    pipe.execute()
+
+
 def enqueue(value: float, key: str):
-    r.rpush(key, value)
-    if r.llen(key) > max_lenght:
-        _ = r.lpop(key)
+    enqueue_many([(key, value)])
+
+
+def _to_array(rows: list[list[bytes]]) -> np.ndarray:
+    # Right-align each list so the newest sample always sits in the last column
+    width = max((len(row) for row in rows), default=0)
+    values = np.full((len(rows), width), np.nan)
+    for i, row in enumerate(rows):
+        if row:
+            values[i, width - len(row) :] = np.array(row, dtype=np.float64)
+    return values
+
+
+def _trimmed_mean(values: np.ndarray, proportion: float) -> np.ndarray:
+    ordered = np.sort(values, axis=1)  # NaN sorts to the end
+    counts = np.isfinite(ordered).sum(axis=1, keepdims=True)
+    cut = np.floor(counts * proportion)
+    index = np.arange(ordered.shape[1])
+    keep = (index >= cut) & (index < counts - cut)
+    return np.nanmean(np.where(keep, ordered, np.nan), axis=1)
+
+
+def _ewma(values: np.ndarray, alpha: float) -> np.ndarray:
+    age = np.arange(values.shape[1])[::-1]
+    weights = np.where(np.isfinite(values), (1.0 - alpha) ** age, 0.0)
+    return np.nansum(values * weights, axis=1) / weights.sum(axis=1)
+
+
+def aggregate(
+    values: np.ndarray,
+    method: str = "mean",
+    proportion: float = 0.1,
+    alpha: float = 0.3,
+) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        if values.shape[1] == 0:
+            return np.full(values.shape[0], np.nan)
+        if method == "mean":
+            return np.nanmean(values, axis=1)
+        if method == "median":
+            return np.nanmedian(values, axis=1)
+        if method == "trimmed":
+            return _trimmed_mean(values, proportion)
+        if method == "ewma":
+            return _ewma(values, alpha)
+    raise ValueError(f"Unknown aggregation method: {method}")
+
+
+def get_rssi_matrix(
+    device_macs: list[str], gateway_macs: list[str], method: str = "mean", **kwargs
+) -> np.ndarray:
+    pipe = r.pipeline(transaction=False)
+    for device in device_macs:
+        for gateway in gateway_macs:
+            pipe.lrange(f"{device}_{gateway}", 0, -1)
+    values = _to_array(pipe.execute())
+    result = aggregate(values, method, **kwargs)
+    return result.reshape(len(device_macs), len(gateway_macs))
 
 
-def get_avg(key: str):
-    return np.mean([float(i) for i in r.lrange(key, 0, -1)])
+def get_avg(key: str, method: str = "mean", **kwargs):
+    return aggregate(_to_array([r.lrange(key, 0, -1)]), method, **kwargs)[0]
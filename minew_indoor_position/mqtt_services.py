@@ -1,18 +1,36 @@
 import json
+import logging
+import queue
+import threading
+import time
 
 import paho.mqtt.client as mqtt
 from core.config import settings
-from db.services import enqueue
+from db.services import enqueue_many
+
+logger = logging.getLogger(__name__)
 
 host = settings.MQTT_HOST
 port = str(settings.MQTT_PORT)
-mac_devices = settings.DEVICE_MACS
+# Settings already upper-cases device MACs; a set keeps the per-beacon check O(1)
+mac_devices = frozenset(settings.DEVICE_MACS)
 mac_gateways = settings.GATEWAY_MACS
 mac_mg3 = settings.MG3_MACS
 
+ingest_queue: queue.Queue = queue.Queue(maxsize=settings.INGEST_QUEUE_SIZE)
+ingest_stats = {
+    "enqueued": 0,
+    "dropped": 0,
+    "processed": 0,
+    "batches": 0,
+    "malformed": 0,
+    "failed_flushes": 0,
+    "lost_samples": 0,
+}
+
 
 def on_connect(client, userdata, flags, reason_code, properties):  # noqa: ARG001
-    print(f"Connected with result code {reason_code}")
+    logger.info("Connected with result code %s", reason_code)
 
     for mac in mac_mg3:
         client.subscribe(f"/mg3/{mac}/status")
@@ -21,26 +39,71 @@ def on_connect(client, userdata, flags, reason_code, properties):  # noqa: ARG00
 
 
 def on_message(client, userdata, msg):  # noqa: ARG001
-    data_str = str(msg.payload.decode("UTF-8"))
+    # Runs on the paho network thread, so only hand the raw frame over
+    try:
+        ingest_queue.put_nowait((msg.topic, msg.payload, time.time()))
+        ingest_stats["enqueued"] += 1
+    except queue.Full:
+        ingest_stats["dropped"] += 1
+
+
+def parse_samples(topic: str, payload: bytes) -> list[tuple[str, float]]:
+    data_str = str(payload.decode("UTF-8"))
+    gateway_name = str(topic).split("/")[2]
+    samples = []
     for data in json.loads(data_str):
         if data.get("type") == "Gateway":
             pass
         elif data.get("type") is None or data.get("type") == "iBeacon":
             if data.get("mac") in mac_devices:
-                gateway_name = str(msg.topic).split("/")[2]
                 device_name = data.get("mac")
-                enqueue(value=data.get("rssi"), key=f"{device_name}_{gateway_name}")
+                samples.append((f"{device_name}_{gateway_name}", data.get("rssi")))
         # elif data.get("type") == "iBeacon":
         #     if data.get("mac") in mac_devices:
         #         print(data)
+    return samples
+
+
+def drain_ingest_queue():
+    while True:
+        batch = [ingest_queue.get()]
+        while len(batch) < settings.INGEST_BATCH_SIZE:
+            try:
+                batch.append(ingest_queue.get_nowait())
+            except queue.Empty:
+                break
+        samples = []
+        for topic, payload, _ in batch:
+            try:
+                samples.extend(parse_samples(topic, payload))
+            except (ValueError, AttributeError) as e:
+                logger.debug("Skipping malformed payload on %s: %s", topic, e)
+                ingest_stats["malformed"] += 1
+            except Exception:
+                # e.g. a JSON scalar instead of a list; keep the thread alive
+                logger.exception("Failed to parse payload on %s", topic)
+                ingest_stats["malformed"] += 1
+        # One Redis pipeline for the whole batch
+        try:
+            enqueue_many(samples)
+        except Exception:
+            logger.exception("Failed to write %d samples to Redis", len(samples))
+            ingest_stats["failed_flushes"] += 1
+            ingest_stats["lost_samples"] += len(samples)
+        ingest_stats["processed"] += len(batch)
+        ingest_stats["batches"] += 1
 
 
 if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
     mqttc = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
     mqttc.on_connect = on_connect
     mqttc.on_message = on_message
     mqttc.username_pw_set(username="erudite", password="Erud1t3wifi")
 
     mqttc.connect(host=host, port=int(port))
+    threading.Thread(target=drain_ingest_queue, daemon=True).start()
 
     mqttc.loop_forever()
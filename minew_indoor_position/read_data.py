@@ -1,5 +1,5 @@
 from core.config import settings
-from db.services import get_avg
+from db.services import get_rssi_matrix
 
 if __name__ == "__main__":
     device_macs = settings.DEVICE_MACS
@@ -8,5 +8,5 @@ if __name__ == "__main__":
     print(device_macs)
     print(gateway_macs)
 
-    print(get_avg(key=f"{device_macs[0]}_{gateway_macs[0]}"))
-    print(get_avg(key=f"{device_macs[0]}_{gateway_macs[1]}"))
+    print(get_rssi_matrix(device_macs, gateway_macs))
+    print(get_rssi_matrix(device_macs, gateway_macs, method="median"))
@@ -1,14 +1,18 @@
 import json
+import logging
 import uuid
+from collections import deque
 from datetime import datetime
 from threading import Thread
-from typing import Dict, List, Optional
+from typing import Dict, Optional
 
 import paho.mqtt.client as mqtt
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from sqlmodel import Field, Session, SQLModel, create_engine
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI()
 
 # In-memory database for MAC addresses
@@ -18,7 +22,7 @@ mac_data = {
     "mg3": ["ac233fc160f5", "ac233fc160e3"],
 }
 
-mqtt_data_store: Dict[str, List[Dict[str, str]]] = {}
+mqtt_data_store: dict[str, deque[dict[str, str]]] = {}
 gateway_response_store: Dict[str, str] = {}
 mqtt_client = None
 gateway_config_store = {}
@@ -74,7 +78,7 @@ def subscribe_to_mqtt_topics(mac_gateways, mac_mg3):
 
 
 def on_connect(client, userdata, flags, reason_code, properties):  # noqa: ARG001
-    print(f"Connected with result code {reason_code}")
+    logger.info("Connected with result code %s", reason_code)
     mac_gateways = mac_data["gw"]
     mac_mg3 = mac_data["mg3"]
     subscribe_to_mqtt_topics(mac_gateways, mac_mg3)
@@ -93,13 +97,17 @@ def on_message(client, userdata, msg):  # noqa: ARG001
         ):  # Check if the message contains configuration details
             # Handle configuration details
             gateway_config_store[gateway_mac] = data_str["currentConfig"]
-            print(
-                f"Received configuration details from gateway {gateway_mac}: {data_str}"
+            logger.debug(
+                "Received configuration details from gateway %s: %s",
+                gateway_mac,
+                data_str,
             )
         else:
             # Handle online status or error response
             gateway_response_store[gateway_mac] = data_str
-            print(f"Received status response from gateway {gateway_mac}: {data_str}")
+            logger.debug(
+                "Received status response from gateway %s: %s", gateway_mac, data_str
+            )
 
     else:
         for data in json.loads(data_str):
@@ -111,9 +119,9 @@ def on_message(client, userdata, msg):  # noqa: ARG001
                 rawData = data.get("rawData")
                 timestamp = datetime.utcnow().isoformat()
 
-                # Store the data in a structured way
+                # Store the data in a bounded deque; the oldest record drops in O(1)
                 if mac not in mqtt_data_store:
-                    mqtt_data_store[mac] = []
+                    mqtt_data_store[mac] = deque(maxlen=100)
 
                 mqtt_data_store[mac].append(
                     {
@@ -124,11 +132,6 @@ def on_message(client, userdata, msg):  # noqa: ARG001
                     }
                 )
 
-                if len(mqtt_data_store[mac]) > 100:
-                    mqtt_data_store[mac] = mqtt_data_store[mac][
-                        -100:
-                    ]  # Keep only the last 100 records
-
         # print(f"Received message: {msg.payload.decode('utf-8')}")
 
 
@@ -176,7 +179,7 @@ async def add_mac(mac: MACAddress):
         )
 
     mac_data[category].append(mac_address)
-    print(f"Added new MAC address {mac_address} to {category}")
+    logger.info("Added new MAC address %s to %s", mac_address, category)
 
     # Insert the new gateway into the SQLite database
     with Session(engine) as session:
@@ -220,7 +223,7 @@ async def delete_mac(category: str, mac_address: str):
         )
 
     mac_data[category].remove(mac_address)
-    print(f"Removed MAC address {mac_address} from {category}")
+    logger.info("Removed MAC address %s from %s", mac_address, category)
 
     # Unsubscribe from the MQTT topic for this MAC address
     if mqtt_client:
@@ -0,0 +1,57 @@
+"""Synthetic Minew gateway traffic for the benchmarks."""
+
+import json
+import random
+
+GATEWAY_MACS = [f"ac233fc1{i:04x}" for i in range(16)]
+
+
+def beacon_mac(i: int) -> str:
+    return f"C3{i:010X}"
+
+
+def beacon(i: int, rng: random.Random) -> dict:
+    return {
+        "timestamp": "2024-10-09T08:00:00.000Z",
+        "type": "iBeacon",
+        "mac": beacon_mac(i),
+        "bleName": "",
+        "ibeaconUuid": "E2C56DB5DFFB48D2B060D0F5A71096E0",
+        "ibeaconMajor": 0,
+        "ibeaconMinor": 0,
+        "rssi": rng.randint(-100, -40),
+        "ibeaconTxPower": -59,
+        "battery": 0,
+    }
+
+
+def status_payload(beacons: int, population: int | None = None, seed: int = 0) -> bytes:
+    # One gateway upload: a Gateway heartbeat followed by `beacons` iBeacon records
+    rng = random.Random(seed)
+    population = population or beacons
+    records = [
+        {
+            "timestamp": "2024-10-09T08:00:00.000Z",
+            "type": "Gateway",
+            "mac": "AC233FC18BEF",
+        }
+    ]
+    records.extend(beacon(rng.randrange(population), rng) for _ in range(beacons))
+    return json.dumps(records).encode()
+
+
+def status_topic(gateway_mac: str = GATEWAY_MACS[0]) -> str:
+    return f"/gw/{gateway_mac}/status"
+
+
+def samples(count: int, population: int, seed: int = 0) -> list[tuple[str, int, str]]:
+    # (beacon mac, rssi, gateway mac) triples as they leave the parser
+    rng = random.Random(seed)
+    return [
+        (
+            beacon_mac(rng.randrange(population)).lower(),
+            rng.randint(-100, -40),
+            rng.choice(GATEWAY_MACS),
+        )
+        for _ in range(count)
+    ]
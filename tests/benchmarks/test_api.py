@@ -0,0 +1,57 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from router import _encode_page, _iter_ndjson, combined_router  # noqa: E402
+from rssi_store import RECORD_FIELDS, RssiStore  # noqa: E402
+from utility import mqtt_manager  # noqa: E402
+
+from .payloads import samples  # noqa: E402
+
+SIZES = [1_000, 10_000, 100_000]
+
+
+@pytest.fixture(params=SIZES, ids=lambda n: f"{n}beacons")
+def populated_store(request, monkeypatch):
+    # 10 samples per beacon spread over the gateways
+    store = RssiStore(100)
+    for i, (mac, rssi, gateway) in enumerate(
+        samples(request.param * 10, request.param)
+    ):
+        store.append(mac, rssi, gateway, 1_700_000_000.0 + i * 0.01)
+    monkeypatch.setattr(mqtt_manager, "mqtt_data_store", store)
+    return store
+
+
+@pytest.fixture(scope="module")
+def client():
+    app = FastAPI()
+    app.include_router(combined_router)
+    return TestClient(app)
+
+
+def test_encode_page(benchmark, populated_store):
+    macs = sorted(populated_store)
+    body = benchmark(_encode_page, macs, 1000, None, None, RECORD_FIELDS)
+    assert body
+
+
+def test_iter_ndjson(benchmark, populated_store):
+    macs = sorted(populated_store)
+    benchmark(
+        lambda: sum(len(line) for line in _iter_ndjson(macs, None, None, RECORD_FIELDS))
+    )
+
+
+@pytest.mark.usefixtures("populated_store")
+def test_get_all_mac_data(benchmark, client):
+    response = benchmark(client.get, "/macs/data/all", params={"limit": 1000})
+    assert response.status_code == 200
+
+
+def test_get_mac_data(benchmark, client, populated_store):
+    mac = next(iter(populated_store))
+    response = benchmark(client.get, f"/macs/data/{mac}")
+    assert response.status_code == 200
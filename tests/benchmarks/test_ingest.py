@@ -0,0 +1,53 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import codec  # noqa: E402
+from rssi_store import RssiStore  # noqa: E402
+from utility import MQTTManager  # noqa: E402
+
+from .payloads import GATEWAY_MACS, samples, status_payload, status_topic  # noqa: E402
+
+BEACONS_PER_MESSAGE = [10, 100, 1000]
+
+
+@pytest.mark.parametrize("beacons", BEACONS_PER_MESSAGE)
+def test_decode_beacons(benchmark, beacons):
+    payload = status_payload(beacons)
+    result = benchmark(codec.decode_beacons, payload)
+    assert len(result) == beacons + 1
+
+
+@pytest.mark.parametrize("beacons", BEACONS_PER_MESSAGE)
+def test_process_data(benchmark, beacons):
+    manager = MQTTManager()
+    payload = status_payload(beacons, population=10_000)
+    benchmark(manager.process_data, GATEWAY_MACS[0], payload)
+    assert len(manager.mqtt_data_store) > 0
+
+
+def test_handle_batch(benchmark):
+    # Topic routing plus parsing for one worker batch of 100-beacon uploads
+    manager = MQTTManager()
+    manager.registry.load(("gw", mac, {}) for mac in GATEWAY_MACS)
+    batch = [
+        (status_topic(mac), status_payload(100, 10_000, seed=i), 0.0)
+        for i, mac in enumerate(GATEWAY_MACS * 6)
+    ]
+    benchmark(manager.handle_batch, batch)
+    assert manager.topic_router.routed > 0
+
+
+@pytest.mark.parametrize("population", [1_000, 100_000])
+def test_store_append(benchmark, population):
+    # Steady state: every beacon already has a buffer, so appends never allocate
+    store = RssiStore(100)
+    rows = samples(10_000, population)
+    for mac, rssi, gateway in samples(population * 10, population, seed=1):
+        store.append(mac, rssi, gateway, 0.0)
+
+    def append_all():
+        for mac, rssi, gateway in rows:
+            store.append(mac, rssi, gateway, 1.0)
+
+    benchmark(append_all)
@@ -0,0 +1,39 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import numpy as np  # noqa: E402
+from fingerprint import FingerprintIndex, RadioMap  # noqa: E402
+
+from .payloads import GATEWAY_MACS  # noqa: E402
+
+
+def radio_map(points: int, seed: int = 0) -> RadioMap:
+    # A 100 x 100 m floor with the gateways spread over it, log-distance RSSI
+    anchors = np.random.default_rng(0).uniform(0, 100, (len(GATEWAY_MACS), 2))
+    rng = np.random.default_rng(seed)
+    coords = np.column_stack([rng.uniform(0, 100, (points, 2)), np.zeros(points)])
+    distance = np.linalg.norm(coords[:, None, :2] - anchors[None], axis=2)
+    vectors = -59.0 - 20.0 * np.log10(np.maximum(distance, 1.0))
+    vectors += rng.normal(0, 2, vectors.shape)
+    vectors[vectors < -95] = np.nan
+    return RadioMap(list(GATEWAY_MACS), coords, vectors)
+
+
+@pytest.mark.parametrize("points", [10_000, 50_000])
+def test_fingerprint_lookup(benchmark, points):
+    # One beacon against tens of thousands of reference points
+    survey = radio_map(points)
+    index = FingerprintIndex(survey)
+    query = survey.vectors[:1] + 1.0
+    positions, _ = benchmark(index.query, query, 4)
+    assert np.isfinite(positions).all()
+
+
+def test_fingerprint_batch(benchmark):
+    # A whole positioning cycle: every beacon in one query
+    survey = radio_map(50_000)
+    index = FingerprintIndex(survey)
+    queries = radio_map(1_000, seed=1).vectors
+    positions, _ = benchmark(index.query, queries, 4)
+    assert positions.shape == (1_000, 3)
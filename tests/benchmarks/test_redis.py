@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from .conftest import import_minew  # noqa: E402
+from .payloads import GATEWAY_MACS, beacon_mac, samples  # noqa: E402
+
+services = import_minew("db.services")
+
+pytestmark = pytest.mark.usefixtures("redis_client")
+
+
+@pytest.fixture(scope="module")
+def redis_client():
+    # BENCH_REDIS_URL points at a real server; otherwise fall back to fakeredis
+    url = os.environ.get("BENCH_REDIS_URL")
+    if url:
+        import redis
+
+        client = redis.Redis.from_url(url)
+    else:
+        fakeredis = pytest.importorskip("fakeredis")
+        client = fakeredis.FakeRedis()
+    original, services.r = services.r, client
+    client.flushdb()
+    yield client
+    client.flushdb()
+    services.r = original
+
+
+def _fill(devices: int):
+    services.enqueue_many(
+        (f"{mac.upper()}_{gateway}", rssi)
+        for mac, rssi, gateway in samples(devices * len(GATEWAY_MACS) * 10, devices)
+    )
+
+
+def test_enqueue(benchmark):
+    benchmark(services.enqueue, -70, f"{beacon_mac(0)}_{GATEWAY_MACS[0]}")
+
+
+@pytest.mark.parametrize("beacons", [100, 1000])
+def test_enqueue_many(benchmark, beacons):
+    rows = [
+        (f"{mac.upper()}_{gateway}", rssi)
+        for mac, rssi, gateway in samples(beacons, 1000)
+    ]
+    benchmark(services.enqueue_many, rows)
+
+
+@pytest.mark.parametrize("method", ["mean", "median", "trimmed", "ewma"])
+def test_get_avg(benchmark, method):
+    _fill(10)
+    key = f"{beacon_mac(0)}_{GATEWAY_MACS[0]}"
+    benchmark(services.get_avg, key, method)
+
+
+@pytest.mark.parametrize("devices", [10, 100])
+def test_get_rssi_matrix(benchmark, devices):
+    _fill(devices)
+    macs = [beacon_mac(i) for i in range(devices)]
+    result = benchmark(services.get_rssi_matrix, macs, GATEWAY_MACS)
+    assert result.shape == (devices, len(GATEWAY_MACS))
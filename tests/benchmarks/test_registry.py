@@ -0,0 +1,51 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from database import apply_gateway_changes, load_gateways  # noqa: E402
+from models.gateway import Gateway  # noqa: E402
+from registry import MacRegistry  # noqa: E402
+
+from .payloads import beacon_mac  # noqa: E402
+
+
+def _gateways(count: int) -> dict[str, Gateway]:
+    return {
+        f"ac233f{i:06x}": Gateway(
+            mac_address=f"ac233f{i:06x}",
+            name=f"gw-{i}",
+            gw_type="gw",
+            x=float(i),
+            y=0.0,
+            z=0.0,
+        )
+        for i in range(count)
+    }
+
+
+@pytest.mark.parametrize("count", [100, 1000])
+def test_apply_gateway_changes(benchmark, count):
+    load_gateways()  # creates the tables
+    upserts = _gateways(count)
+    benchmark(apply_gateway_changes, upserts, [])
+
+
+def test_load_gateways(benchmark):
+    load_gateways()
+    apply_gateway_changes(_gateways(1000), [])
+    rows = benchmark(load_gateways)
+    assert len(rows) >= 1000
+
+
+@pytest.mark.parametrize("count", [1_000, 10_000])
+def test_registry_load(benchmark, count):
+    registry = MacRegistry()
+    entries = [("devices", beacon_mac(i), {}) for i in range(count)]
+    benchmark(registry.load, entries)
+
+
+def test_registry_lookup(benchmark):
+    registry = MacRegistry()
+    registry.load(("devices", beacon_mac(i), {}) for i in range(10_000))
+    macs = [beacon_mac(i) for i in range(0, 20_000, 20)]
+    benchmark(lambda: [registry.category_of(mac) for mac in macs])
@@ -0,0 +1,14 @@
+"""Unit tests for the backend modules; no MQTT broker, Redis or network."""
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+# The backend modules import each other as top-level modules, like under uvicorn
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+# Keep the test database away from backend/gateway_data.db
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='test-')}/gateway.db"
+)
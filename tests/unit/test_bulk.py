@@ -0,0 +1,148 @@
+import pytest
+from bulk import validate_rows
+from database import engine, load_gateways
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from models.gateway import Gateway
+from registry import MacRegistry
+from router import combined_router
+from sqlmodel import Session, delete
+from utility import mqtt_manager
+
+
+def row(mac: str, category: str = "gw", **extra) -> dict:
+    return {"category": category, "mac_address": mac, "x": 1, "y": 2, "z": 3, **extra}
+
+
+def registry_with(*entries: tuple[str, str, dict]) -> MacRegistry:
+    registry = MacRegistry()
+    registry.load(entries)
+    return registry
+
+
+class FakeMqttClient:
+    def __init__(self):
+        self.subscribed, self.unsubscribed = [], []
+
+    def subscribe(self, topics):
+        self.subscribed.extend(topic for topic, _ in topics)
+
+    def unsubscribe(self, topics):
+        self.unsubscribed.extend(topics)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    load_gateways()
+    with Session(engine) as session:
+        session.exec(delete(Gateway))
+        session.commit()
+    monkeypatch.setattr(mqtt_manager, "registry", MacRegistry())
+    monkeypatch.setattr(mqtt_manager, "mqtt_client", FakeMqttClient())
+    monkeypatch.setattr(mqtt_manager, "wildcard_subscribe", False)
+    app = FastAPI()
+    app.include_router(combined_router)
+    return TestClient(app)
+
+
+def test_valid_rows_become_gateways():
+    gateways, errors = validate_rows(
+        [row("AA:BB:CC:DD:EE:01", id="7"), row("aabbccddee02", "mg3", name="lobby")],
+        MacRegistry().snapshot,
+        upsert=False,
+    )
+    assert errors == []
+    assert [(g.mac_address, g.gw_type, g.id) for g in gateways] == [
+        ("aabbccddee01", "gw", 7),
+        ("aabbccddee02", "mg3", None),
+    ]
+    assert gateways[1].name == "lobby" and gateways[0].name == "aabbccddee01"
+
+
+def test_invalid_rows_are_reported_per_row():
+    _, errors = validate_rows(
+        [
+            row("aabbccddee01", category="beacon"),
+            row("not-a-mac"),
+            row("aabbccddee03", x="left", id="five"),
+        ],
+        MacRegistry().snapshot,
+        upsert=False,
+    )
+    assert [e["row"] for e in errors] == [1, 2, 3]
+    assert "invalid category 'beacon'" in errors[0]["errors"]
+    assert errors[1]["errors"] == ["invalid MAC address 'not-a-mac'"]
+    assert errors[2]["errors"] == ["x must be a number", "id must be an integer"]
+
+
+def test_duplicate_macs():
+    snapshot = registry_with(("gw", "aabbccddee01", {"id": 1})).snapshot
+    rows = [row("aabbccddee01"), row("aabbccddee02"), row("AABBCCDDEE02")]
+    _, errors = validate_rows(rows, snapshot, upsert=False)
+    assert errors == [
+        {"row": 1, "errors": ["MAC address aabbccddee01 already exists"]},
+        {"row": 3, "errors": ["duplicate MAC address aabbccddee02 in batch"]},
+    ]
+    # Upsert allows existing MACs but never the same MAC twice in one batch
+    _, errors = validate_rows(rows, snapshot, upsert=True)
+    assert [e["row"] for e in errors] == [3]
+
+
+def test_duplicate_ids():
+    snapshot = registry_with(("gw", "aabbccddee01", {"id": 1})).snapshot
+    rows = [
+        row("aabbccddee02", id=5),
+        row("aabbccddee03", id=5),
+        row("aabbccddee04", id=1),
+        row("aabbccddee01", id=1),
+    ]
+    _, errors = validate_rows(rows, snapshot, upsert=True)
+    assert errors == [
+        {"row": 2, "errors": ["duplicate id 5 in batch"]},
+        {"row": 3, "errors": ["id 1 is taken by aabbccddee01"]},
+    ]
+
+
+def test_import_rejects_the_whole_batch(client):
+    response = client.post(
+        "/macs/bulk", json=[row("aabbccddee01", id=5), row("aabbccddee02", id=5)]
+    )
+    assert response.status_code == 422
+    assert response.json()["detail"] == [
+        {"row": 2, "errors": ["duplicate id 5 in batch"]}
+    ]
+    assert "aabbccddee01" not in mqtt_manager.registry
+
+
+def test_import_and_upsert(client):
+    response = client.post("/macs/bulk", json=[row("aabbccddee01", id=5)])
+    assert response.json()["imported"] == 1
+    assert mqtt_manager.registry.metadata("aabbccddee01")["id"] == 5
+
+    moved = row("aabbccddee01", "mg3", x=9, id=5)
+    assert client.post("/macs/bulk", json=[moved]).status_code == 422
+    assert client.post("/macs/bulk?upsert=true", json=[moved]).status_code == 200
+    assert mqtt_manager.registry.category_of("aabbccddee01") == "mg3"
+    assert mqtt_manager.registry.metadata("aabbccddee01")["x"] == 9
+    mqtt = mqtt_manager.mqtt_client
+    assert "/gw/aabbccddee01/status" in mqtt.unsubscribed
+    assert "/mg3/aabbccddee01/status" in mqtt.subscribed
+
+    exported = client.get("/macs/export").json()
+    assert [(r["category"], r["mac_address"], r["id"]) for r in exported] == [
+        ("mg3", "aabbccddee01", 5)
+    ]
+
+
+def test_import_id_conflict_in_the_database_is_409(client):
+    # The registry does not know id 5 yet, SQLite does
+    with Session(engine) as session:
+        session.add(
+            Gateway(
+                id=5, mac_address="aabbccddee09", name="x", x=0, y=0, z=0, gw_type="gw"
+            )
+        )
+        session.commit()
+    response = client.post("/macs/bulk", json=[row("aabbccddee01", id=5)])
+    assert response.status_code == 409
+    assert "aabbccddee01" not in mqtt_manager.registry
@@ -0,0 +1,59 @@
+import numpy as np
+from filters import FilterBank
+
+
+def feed(bank: FilterBank, values, gateway="gw1", mac="beacon", start=0.0):
+    for i, rssi in enumerate(values):
+        bank.update(gateway, [(mac, rssi)], start + i)
+
+
+def test_hampel_replaces_outlier_with_median():
+    bank = FilterBank()
+    feed(bank, [-60, -61, -60, -59, -60, -20])
+    state = bank.beacons["beacon"]["gw1"]
+    assert state.outliers == 1
+    assert state.last_rssi == -20
+    # The spike never reaches the smoothed signals
+    assert abs(state.ewma + 60) < 1.0
+    assert abs(state.kalman + 60) < 1.0
+
+
+def test_ordinary_jitter_is_not_an_outlier():
+    bank = FilterBank()
+    feed(bank, [-60, -61, -60, -62, -59, -61, -60])
+    assert bank.beacons["beacon"]["gw1"].outliers == 0
+
+
+def test_kalman_converges_and_variance_shrinks():
+    bank = FilterBank()
+    rng = np.random.default_rng(0)
+    feed(bank, [-70] * 3 + list(np.round(-70 + rng.normal(0, 2, 200)).astype(int)))
+    state = bank.beacons["beacon"]["gw1"]
+    assert abs(state.kalman + 70) < 1.5
+    assert state.variance < bank.kalman_r
+
+
+def test_kalman_follows_a_step():
+    bank = FilterBank()
+    # A step the Hampel window absorbs once it holds the new level
+    feed(bank, [-60] * 10 + [-75] * 40)
+    state = bank.beacons["beacon"]["gw1"]
+    assert abs(state.kalman + 75) < 1.0
+    assert state.median == -75
+
+
+def test_matrix_and_sweep():
+    bank = FilterBank()
+    feed(bank, [-60, -62], gateway="gw1", mac="a")
+    feed(bank, [-70], gateway="gw2", mac="b", start=100.0)
+    beacons, matrix = bank.matrix(["gw1", "gw2"], signal="raw")
+    rows = dict(zip(beacons, matrix.tolist(), strict=True))
+    assert rows["a"][0] == -62 and np.isnan(rows["a"][1])
+    assert rows["b"][1] == -70 and np.isnan(rows["b"][0])
+
+    # Stale pairs read as unheard
+    beacons, matrix = bank.matrix(["gw1", "gw2"], max_age=10.0, now=105.0)
+    rows = dict(zip(beacons, matrix.tolist(), strict=True))
+    assert np.isnan(rows["a"]).all() and rows["b"][1] == -70
+    assert bank.sweep(idle_before=50.0) == 1
+    assert set(bank.beacons) == {"b"}
@@ -0,0 +1,187 @@
+import fingerprint
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from filters import FilterBank
+from fingerprint import Fingerprinter, FingerprintIndex, RadioMap
+from positioning import PositionEngine, position_engine
+from registry import MacRegistry
+from router import combined_router
+from utility import mqtt_manager
+
+GATEWAYS = ["ac233fc00001", "ac233fc00002", "ac233fc00003"]
+
+# A 3 x 3 grid, 5 m apart; RSSI falls 2 dB per metre from each gateway
+ANCHORS = np.array([[0.0, 0.0], [10.0, 0.0], [0.0, 10.0]])
+
+
+def survey(x: float, y: float) -> dict[str, float]:
+    distance = np.linalg.norm(ANCHORS - [x, y], axis=1)
+    return dict(zip(GATEWAYS, (-40.0 - 2.0 * distance).tolist(), strict=True))
+
+
+def grid_points() -> list:
+    return [
+        ((x, y, 0.0), survey(x, y)) for x in (0.0, 5.0, 10.0) for y in (0.0, 5.0, 10.0)
+    ]
+
+
+def grid_map() -> RadioMap:
+    radio_map = RadioMap()
+    radio_map.add(grid_points())
+    return radio_map
+
+
+def vectors(*points: tuple[float, float]) -> np.ndarray:
+    return np.array([[survey(x, y)[g] for g in GATEWAYS] for x, y in points])
+
+
+@pytest.fixture(params=["numpy", "kdtree"])
+def backend(request, monkeypatch):
+    if request.param == "kdtree":
+        pytest.importorskip("scipy.spatial")
+    else:
+        monkeypatch.setattr(fingerprint, "cKDTree", None)
+    return request.param
+
+
+def test_exact_match_returns_the_reference_point(backend):
+    index = FingerprintIndex(grid_map())
+    assert (index.tree is None) == (backend == "numpy")
+    positions, nearest = index.query(vectors((5.0, 5.0), (10.0, 0.0)), k=4)
+    # Other neighbours keep a tiny weight, floored at 1e-6 dB distance
+    np.testing.assert_allclose(
+        positions, [[5.0, 5.0, 0.0], [10.0, 0.0, 0.0]], atol=1e-5
+    )
+    np.testing.assert_allclose(nearest, [0.0, 0.0], atol=1e-9)
+
+
+@pytest.mark.usefixtures("backend")
+def test_weighted_neighbours():
+    radio_map = RadioMap()
+    radio_map.add([((0.0, 0.0, 0.0), {"g1": -50.0}), ((4.0, 0.0, 0.0), {"g1": -60.0})])
+    radio_map.add([((100.0, 0.0, 0.0), {"g1": -90.0})])
+    index = FingerprintIndex(radio_map)
+    # 2 dB from the first point, 8 dB from the second: weights 1/2 and 1/8
+    positions, nearest = index.query(np.array([[-52.0]]), k=2)
+    np.testing.assert_allclose(positions, [[0.8, 0.0, 0.0]])
+    assert nearest.tolist() == [2.0]
+
+
+@pytest.mark.usefixtures("backend")
+def test_unheard_gateways_count_as_missing_rssi():
+    radio_map = RadioMap()
+    radio_map.add(
+        [
+            ((0.0, 0.0, 0.0), {"g1": -50.0}),
+            ((9.0, 0.0, 0.0), {"g1": -50.0, "g2": -50.0}),
+        ]
+    )
+    assert radio_map.gateway_macs == ["g1", "g2"]
+    assert np.isnan(radio_map.vectors[0, 1])
+    index = FingerprintIndex(radio_map, missing_rssi=-100.0)
+    positions, _ = index.query(np.array([[-50.0, np.nan], [-50.0, -51.0]]), k=1)
+    np.testing.assert_allclose(positions[:, 0], [0.0, 9.0])
+
+
+@pytest.mark.usefixtures("backend")
+def test_empty_queries():
+    index = FingerprintIndex(grid_map())
+    positions, nearest = index.query(np.empty((0, 3)), k=4)
+    assert positions.shape == (0, 3) and nearest.shape == (0,)
+    positions, _ = FingerprintIndex(RadioMap(GATEWAYS)).query(vectors((1, 1)), k=4)
+    assert np.isnan(positions).all()
+
+
+def test_radio_map_persists(tmp_path):
+    path = str(tmp_path / "map.npz")
+    fingerprinter = Fingerprinter(path, k=2)
+    fingerprinter.add([((1.0, 2.0, 0.0), {"g1": -50.0})])
+    loaded = Fingerprinter(path)
+    assert len(loaded) == 1 and loaded.radio_map.gateway_macs == ["g1"]
+    loaded.clear()
+    assert len(Fingerprinter(path)) == 0
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setattr(mqtt_manager, "filters", FilterBank())
+    engine = PositionEngine(
+        mode="fingerprint", signal="raw", max_age=None, min_gateways=2
+    )
+    engine.fingerprinter = Fingerprinter("", k=1)
+    engine.fingerprinter.add(grid_points())
+    return engine
+
+
+def hear(mac: str, rssi: dict[str, float], ts: float = 1_700_000_000.0):
+    for gateway, value in rssi.items():
+        mqtt_manager.filters.update(gateway, [(mac, int(round(value)))], ts)
+
+
+def test_solve_fingerprint_without_usable_beacons(engine):
+    # Each beacon is heard by one gateway, fewer than min_gateways
+    hear("c30000000001", {GATEWAYS[0]: -50.0})
+    hear("c30000000002", {GATEWAYS[1]: -50.0})
+    beacons, solved, heard = engine.solve_fingerprint()
+    assert sorted(beacons) == ["c30000000001", "c30000000002"]
+    assert np.isnan(solved).all() and heard.tolist() == [1, 1]
+    assert engine.update() == {}
+
+
+def test_solve_fingerprint_mixed(engine):
+    hear("c30000000001", {GATEWAYS[0]: -50.0})
+    hear("c30000000002", survey(10.0, 5.0))
+    positions = engine.update()
+    assert list(positions) == ["c30000000002"]
+    assert (positions["c30000000002"]["x"], positions["c30000000002"]["y"]) == (
+        10.0,
+        5.0,
+    )
+
+
+def test_solve_fingerprint_without_a_map(engine):
+    engine.fingerprinter.clear()
+    hear("c30000000001", survey(5.0, 5.0))
+    beacons, solved, heard = engine.solve_fingerprint()
+    assert beacons == [] and solved.shape == (0, 3) and heard.shape == (0,)
+
+
+def test_endpoints(tmp_path, monkeypatch):
+    monkeypatch.setattr(mqtt_manager, "filters", FilterBank())
+    monkeypatch.setattr(
+        mqtt_manager,
+        "registry",
+        MacRegistry({"gw": GATEWAYS[:2], "mg3": GATEWAYS[2:]}),
+    )
+    monkeypatch.setattr(position_engine, "signal", "raw")
+    monkeypatch.setattr(position_engine, "max_age", None)
+    monkeypatch.setattr(
+        position_engine, "fingerprinter", Fingerprinter(str(tmp_path / "map.npz"))
+    )
+    app = FastAPI()
+    app.include_router(combined_router)
+    client = TestClient(app)
+
+    body = [{"x": 0, "y": 0, "rssi": {g.upper(): -50.0 for g in GATEWAYS}}]
+    assert client.post("/fingerprint/points", json=body).json() == {
+        "recorded": 1,
+        "points": 1,
+    }
+
+    request = {"mac": "C3:00:00:00:00:01", "x": 5, "y": 5, "samples": 1}
+    assert client.post("/fingerprint/calibrate", json=request).status_code == 404
+    hear("c30000000001", {GATEWAYS[0]: -60.0, GATEWAYS[2]: -70.0})
+    response = client.post("/fingerprint/calibrate", json=request).json()
+    assert response == {
+        "recorded": 1,
+        "gateways": [GATEWAYS[0], GATEWAYS[2]],
+        "points": 2,
+    }
+
+    radio_map = client.get("/fingerprint/map").json()
+    assert radio_map["points"] == 2 and radio_map["gateways"] == GATEWAYS
+    assert radio_map["bounds"] == {"min": [0, 0, 0], "max": [5, 5, 0]}
+    client.delete("/fingerprint/map")
+    assert client.get("/fingerprint/map").json()["points"] == 0
@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+
+import history
+import numpy as np
+import pytest
+from history import HistoryWriter
+
+HOUR = 1_700_000_000 // 3600 * 3600
+GATEWAY = "ac233fc00001"
+
+
+def test_writer_thread_survives_failures(tmp_path, monkeypatch):
+    writer = HistoryWriter(str(tmp_path), flush_interval=0.01)
+    real_flush = writer.flush
+    calls = []
+
+    def flaky_flush():
+        calls.append(None)
+        if len(calls) == 1:
+            raise ValueError("bad row")
+        real_flush()
+
+    monkeypatch.setattr(writer, "flush", flaky_flush)
+    writer.start()
+    try:
+        deadline = time.monotonic() + 5
+        while len(calls) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert writer._thread.is_alive()
+        writer.append(GATEWAY, [("c30000000001", -60)], HOUR + 1.0)
+    finally:
+        writer.stop()
+    assert writer.errors == 1
+    assert writer.query(HOUR, HOUR + 3600)["rssi"].tolist() == [-60]
+
+
+def test_bad_macs_drop_only_their_own_samples(tmp_path):
+    writer = HistoryWriter(str(tmp_path))
+    samples = [
+        ("c30000000001", -60),
+        ("not-a-mac", -61),
+        ("c3000000000100", -62),  # wider than 48 bits
+        ("c30000000002", -63),
+    ]
+    writer.append(GATEWAY, samples, HOUR + 1.0)
+    writer.append("bad-gateway", [("c30000000003", -64)], HOUR + 2.0)
+    writer.flush()
+    assert writer.dropped == 3
+    result = writer.query(HOUR, HOUR + 3600, columns=("device", "rssi"))
+    assert result["rssi"].tolist() == [-60, -63]
+    assert result["device"].tolist() == [0xC30000000001, 0xC30000000002]
+
+
+def write_parts(writer: HistoryWriter, parts: int) -> list[int]:
+    rssi = []
+    for i in range(parts):
+        values = [-50 - 3 * i - j for j in range(3)]
+        writer.append(
+            GATEWAY, [(f"c3000000000{j}", v) for j, v in enumerate(values)], HOUR + i
+        )
+        writer.flush()
+        time.sleep(0.001)  # distinct part names
+        rssi += values
+    return sorted(rssi)
+
+
+@pytest.mark.parametrize("before_load", [1, 2, 3])
+def test_query_during_compaction_sees_every_row_once(
+    tmp_path, monkeypatch, before_load
+):
+    writer = HistoryWriter(str(tmp_path))
+    expected = write_parts(writer, 3)
+    real_load = np.load
+    calls = []
+
+    def load(path, *args, **kwargs):
+        calls.append(path)
+        if len(calls) == before_load:
+            assert writer.compact(HOUR // 3600)
+        return real_load(path, *args, **kwargs)
+
+    monkeypatch.setattr(history.np, "load", load)
+    result = writer.query(HOUR, HOUR + 3600)
+    assert sorted(result["rssi"].tolist()) == expected
+    assert os.listdir(os.path.dirname(calls[-1])) == ["compact.npz"]
+
+
+def test_query_waits_for_a_compaction_in_progress(tmp_path, monkeypatch):
+    writer = HistoryWriter(str(tmp_path))
+    expected = write_parts(writer, 3)
+    real_remove = os.remove
+    replaced, release = threading.Event(), threading.Event()
+
+    def remove(path):
+        # Hold the compaction after compact.npz is in place, parts not deleted
+        if os.path.basename(path).startswith("part-"):
+            replaced.set()
+            release.wait(5)
+        real_remove(path)
+
+    monkeypatch.setattr(history.os, "remove", remove)
+    compactor = threading.Thread(target=writer.compact, args=(HOUR // 3600,))
+    compactor.start()
+    assert replaced.wait(5)
+    threading.Timer(0.2, release.set).start()
+    result = writer.query(HOUR, HOUR + 3600)
+    compactor.join()
+    assert sorted(result["rssi"].tolist()) == expected
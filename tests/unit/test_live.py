@@ -0,0 +1,66 @@
+import json
+
+from live import LiveClient, LiveHub
+
+
+def position(x: float, y: float = 0.0) -> dict:
+    return {"x": x, "y": y, "z": 0.0}
+
+
+def frames(client: LiveClient) -> list[dict]:
+    out = []
+    while not client.queue.empty():
+        out.append(json.loads(client.queue.get_nowait()))
+    return out
+
+
+def test_only_moved_positions_are_sent():
+    hub = LiveHub(position_epsilon=0.5)
+    client = hub.subscribe()
+    hub.publish_positions({"a": position(1.0), "b": position(2.0)})
+    hub.flush()
+    assert set(frames(client)[0]["positions"]) == {"a", "b"}
+
+    hub.publish_positions({"a": position(1.2), "b": position(3.0)})
+    hub.flush()
+    assert list(frames(client)[0]["positions"]) == ["b"]
+
+
+def test_new_subscriber_gets_a_snapshot_without_resending_to_others():
+    hub = LiveHub(position_epsilon=0.5)
+    first = hub.subscribe()
+    hub.publish_positions({"a": position(1.0), "b": position(2.0)})
+    hub.flush()
+    frames(first)
+
+    second = hub.subscribe({"b"})
+    assert frames(second)[0]["positions"] == {"b": position(2.0)}
+    hub.publish_positions({"a": position(1.0), "b": position(2.0)})
+    hub.flush()
+    assert frames(first) == [] and frames(second) == []
+
+
+def test_widening_the_filter_sends_the_new_macs():
+    hub = LiveHub(position_epsilon=0.5)
+    client = hub.subscribe({"a"})
+    other = hub.subscribe()
+    hub.publish_positions({"a": position(1.0), "b": position(2.0), "c": position(3)})
+    hub.flush()
+    assert list(frames(client)[-1]["positions"]) == ["a"]
+    frames(other)
+
+    hub.set_filter(client, {"a", "b"})
+    assert frames(client)[0]["positions"] == {"b": position(2.0)}
+    hub.set_filter(client, None)
+    assert frames(client)[0]["positions"] == {"c": position(3)}
+    # Narrowing, or a client that already sees everything, sends nothing
+    hub.set_filter(client, {"a"})
+    hub.set_filter(other, {"a"})
+    assert frames(client) == [] and frames(other) == []
+
+
+def test_positions_published_with_nobody_listening_reach_the_next_client():
+    hub = LiveHub()
+    hub.publish_positions({"a": position(1.0)})
+    client = hub.subscribe()
+    assert frames(client)[0]["positions"] == {"a": position(1.0)}
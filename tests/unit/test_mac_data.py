@@ -0,0 +1,68 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from router import combined_router
+from rssi_store import RssiStore
+from utility import mqtt_manager
+
+MACS = [f"c30000{i:06x}" for i in range(25)]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    store = RssiStore(10)
+    for i, mac in enumerate(reversed(MACS)):
+        store.append(mac, -60 - i % 10, "ac233fc00001", 1_700_000_000.0 + i)
+        store.append(mac, -61 - i % 10, "ac233fc00002", 1_700_000_100.0 + i)
+    monkeypatch.setattr(mqtt_manager, "mqtt_data_store", store)
+    app = FastAPI()
+    app.include_router(combined_router)
+    return TestClient(app)
+
+
+def test_cursor_walks_every_mac_once(client):
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 10, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/macs/data/all", params=params).json()
+        seen.extend(body["data"])
+        pages += 1
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert pages == 3
+    assert seen == MACS
+
+
+def test_page_contents_and_filters(client):
+    body = client.get(
+        "/macs/data/all",
+        params={"limit": 5, "since": 1_700_000_050.0, "fields": "rssi"},
+    ).json()
+    assert list(body["data"]) == MACS[:5]
+    assert body["next_cursor"] == MACS[4]
+    for records in body["data"].values():
+        assert len(records) == 1 and set(records[0]) == {"rssi"}
+
+
+def test_prefix_and_cursor_are_case_insensitive(client):
+    body = client.get(
+        "/macs/data/all",
+        params={"prefix": "C3000000001", "cursor": MACS[16].upper()},
+    ).json()
+    assert list(body["data"]) == MACS[17:]
+    assert body["next_cursor"] is None
+
+
+def test_ndjson_streams_every_mac(client):
+    response = client.get("/macs/data/all", params={"format": "ndjson"})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["mac"] for line in lines] == MACS
+    assert all(len(line["samples"]) == 2 for line in lines)
+
+
+def test_empty_store_is_404(client, monkeypatch):
+    monkeypatch.setattr(mqtt_manager, "mqtt_data_store", RssiStore(10))
+    assert client.get("/macs/data/all").status_code == 404
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+
+import pytest
+from pending import PendingRequests
+
+
+def test_reply_matched_by_request_id():
+    async def main():
+        pending = PendingRequests()
+        first = pending.create("r1", "gw1")
+        second = pending.create("r2", "gw1")
+        assert pending.resolve("gw1", {"requestId": "r2", "code": 200})
+        assert await pending.wait("r2", second, 1.0) == {"requestId": "r2", "code": 200}
+        assert not first.done()
+        pending.discard("r1")
+        return pending.stats()
+
+    assert asyncio.run(main()) == {
+        "pending": 0,
+        "resolved": 1,
+        "timeouts": 0,
+        "unmatched": 0,
+    }
+
+
+def test_reply_without_request_id_answers_the_oldest():
+    async def main():
+        pending = PendingRequests()
+        first = pending.create("r1", "gw1")
+        other = pending.create("r3", "gw2")
+        second = pending.create("r2", "gw1")
+        assert pending.resolve("gw1", {"code": 200})
+        assert await pending.wait("r1", first, 1.0) == {"code": 200}
+        assert not second.done() and not other.done()
+
+    asyncio.run(main())
+
+
+def test_unknown_reply_is_unmatched():
+    async def main():
+        pending = PendingRequests()
+        pending.create("r1", "gw1")
+        assert not pending.resolve("gw1", {"requestId": "nope"})
+        assert not pending.resolve("gw2", {"code": 200})
+        return pending.stats()
+
+    stats = asyncio.run(main())
+    assert stats["unmatched"] == 2 and stats["pending"] == 1
+
+
+def test_timeout_discards_the_request():
+    async def main():
+        pending = PendingRequests()
+        future = pending.create("r1", "gw1")
+        with pytest.raises(asyncio.TimeoutError):
+            await pending.wait("r1", future, 0.01)
+        # A late reply no longer matches anything
+        assert not pending.resolve("gw1", {"requestId": "r1"})
+        return pending.stats()
+
+    assert asyncio.run(main()) == {
+        "pending": 0,
+        "resolved": 0,
+        "timeouts": 1,
+        "unmatched": 1,
+    }
+
+
+def test_resolve_from_another_thread():
+    async def main():
+        pending = PendingRequests()
+        future = pending.create("r1", "gw1")
+        worker = threading.Thread(
+            target=pending.resolve, args=("gw1", {"requestId": "r1"})
+        )
+        worker.start()
+        result = await pending.wait("r1", future, 1.0)
+        worker.join()
+        return result
+
+    assert asyncio.run(main()) == {"requestId": "r1"}
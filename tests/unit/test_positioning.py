@@ -0,0 +1,80 @@
+import numpy as np
+from positioning import rssi_to_distance, trilaterate
+
+ANCHORS_3D = np.array(
+    [[0.0, 0.0, 0.0], [10.0, 0.0, 3.0], [0.0, 10.0, 1.0], [10.0, 10.0, 0.5]]
+)
+ANCHORS_PLANAR = np.array(
+    [[0.0, 0.0, 2.5], [10.0, 0.0, 2.5], [0.0, 10.0, 2.5], [10.0, 10.0, 2.5]]
+)
+
+
+def distances(anchors: np.ndarray, points: np.ndarray) -> np.ndarray:
+    return np.linalg.norm(points[:, None, :] - anchors[None], axis=2)
+
+
+def test_recovers_known_positions():
+    points = np.array([[2.0, 3.0, 1.0], [7.5, 4.0, 2.0], [5.0, 5.0, 0.5]])
+    solved = trilaterate(ANCHORS_3D, distances(ANCHORS_3D, points))
+    np.testing.assert_allclose(solved, points, atol=1e-6)
+
+
+def test_planar_gateways_solve_in_their_plane():
+    points = np.array([[2.0, 3.0, 2.5], [8.0, 6.0, 2.5]])
+    solved = trilaterate(ANCHORS_PLANAR, distances(ANCHORS_PLANAR, points))
+    np.testing.assert_allclose(solved, points, atol=1e-6)
+
+
+def test_unheard_gateways_are_skipped():
+    points = np.array([[2.0, 3.0, 2.5], [8.0, 6.0, 2.5]])
+    d = distances(ANCHORS_PLANAR, points)
+    d[0, 3] = np.nan
+    solved = trilaterate(ANCHORS_PLANAR, d)
+    np.testing.assert_allclose(solved, points, atol=1e-6)
+
+
+def test_planarity_is_decided_by_the_heard_gateways():
+    # Beacon 0 is heard only by the ceiling gateways; one at z=5 heard only
+    # beacon 1 must not turn beacon 0 into a rank-deficient 3-D fit
+    anchors = np.vstack([ANCHORS_PLANAR, [[5.0, 5.0, 5.0]]])
+    points = np.array([[3.0, 4.0, 2.5], [6.0, 2.0, 1.0]])
+    d = distances(anchors, points)
+    d[0, 4] = np.nan
+    solved = trilaterate(anchors, d)
+    np.testing.assert_allclose(solved, points, atol=1e-6)
+
+
+def test_plane_height_comes_from_the_heard_gateways():
+    upstairs = ANCHORS_PLANAR + [0.0, 0.0, 4.0]
+    anchors = np.vstack([ANCHORS_PLANAR, upstairs])
+    points = np.array([[3.0, 4.0, 2.5], [3.0, 4.0, 6.5]])
+    d = distances(anchors, points)
+    d[0, 4:] = np.nan
+    d[1, :4] = np.nan
+    solved = trilaterate(anchors, d)
+    np.testing.assert_allclose(solved, points, atol=1e-6)
+
+
+def test_collinear_gateways_give_nan():
+    anchors = np.array([[0.0, 0.0, 2.5], [5.0, 0.0, 2.5], [10.0, 0.0, 2.5]])
+    solved = trilaterate(anchors, distances(anchors, np.array([[3.0, 4.0, 2.5]])))
+    assert np.isnan(solved).all()
+
+
+def test_too_few_gateways_gives_nan():
+    points = np.array([[2.0, 3.0, 2.5], [8.0, 6.0, 2.5]])
+    d = distances(ANCHORS_PLANAR, points)
+    d[0, 1:] = np.nan
+    solved = trilaterate(ANCHORS_PLANAR, d)
+    assert np.isnan(solved[0]).all()
+    np.testing.assert_allclose(solved[1], points[1], atol=1e-6)
+
+
+def test_empty_input():
+    assert trilaterate(ANCHORS_3D, np.empty((0, 4))).shape == (0, 3)
+    assert np.isnan(trilaterate(np.empty((0, 3)), np.empty((2, 0)))).all()
+
+
+def test_rssi_to_distance():
+    rssi = np.array([-59.0, -79.0])
+    np.testing.assert_allclose(rssi_to_distance(rssi, -59.0, 2.0), [1.0, 10.0])